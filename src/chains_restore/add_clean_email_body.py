@@ -1,8 +1,18 @@
 import pandas as pd
 import numpy as np
 import re
+import os
+import sys
+from functools import lru_cache
 import paths
-        
+
+# Helpers shared by the stages that stream the dataset
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parsing_and_cleaning'))
+from chunked_csv import read_chunks, write_chunk
+
+# Number of distinct email bodies kept in the cleaning cache
+CACHE_SIZE = 100000
+
 def add_clean_text(text):
     '''Cleans the text content for later processing, removing unnecessary characters and spaces.
     
@@ -76,11 +86,19 @@ def add_clean_text(text):
     
     return text.lower()
 
+# Memoized add_clean_text, a body repeated in the dataset is cleaned only once
+# (hit and miss counters are in cached_add_clean_text.cache_info())
+cached_add_clean_text = lru_cache(maxsize=CACHE_SIZE)(add_clean_text)
 
-df = pd.read_csv(paths.DATA_CLEAN_SUBJECT)
-    
-# Additional cleaning of the email body
-df['content-extra-clean'] = df['content'].apply(add_clean_text)
-    
-# Save this more informative version of the dataframe
-df.to_csv(paths.DATA_CLEAN_SUBJECT_INF, index=False)
\ No newline at end of file
+
+if __name__ == "__main__":
+
+    # Read the DataFrame from the CSV file chunk by chunk
+    for first, df in read_chunks(paths.DATA_CLEAN_SUBJECT):
+        # Additional cleaning of the email body
+        df['content-extra-clean'] = df['content'].apply(cached_add_clean_text)
+
+        # Save this more informative version of the dataframe
+        write_chunk(df, paths.DATA_CLEAN_SUBJECT_INF, first)
+
+    print(f"Cleaning cache: {cached_add_clean_text.cache_info()}")
@@ -0,0 +1,57 @@
+import time
+import os
+import sys
+import paths
+from add_clean_email_body import cached_add_clean_text
+
+# Helpers shared by the stages that stream the dataset, and the transforms of the fused stages
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parsing_and_cleaning'))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'subject_groups'))
+from chunked_csv import read_chunks, write_chunk
+from null_subject import add_clean_subject
+from remove_empty_emails import has_words
+
+def clean_chunk(df):
+    '''
+    Apply the subject cleaning, empty emails filtering and additional body cleaning to a chunk.
+
+    This is the fusion of null_subject.py, remove_empty_emails.py and add_clean_email_body.py,
+    all their transforms are row-local, so the chunks can be processed independently.
+
+    Args:
+    - df (pandas.DataFrame): A chunk of the dataset without duplicates.
+
+    Returns:
+    - tuple: The chunk of emails with empty subject, the chunk of clean emails with subject
+      and the same chunk with the 'content-extra-clean' column.
+    '''
+    # Drop rows where 'To' field is unknown (NaN) and clean the subject lines as null_subject.py
+    df = add_clean_subject(df.dropna(subset=['To']))
+
+    df_empty_subject = df[df['subject-clean'] == '']
+    df_subject = df[df['subject-clean'] != '']
+
+    # Remove emails without any words in the body
+    df_subject = df_subject[has_words(df_subject['content'])]
+
+    df_inf = df_subject.copy()
+    df_inf['content-extra-clean'] = df_inf['content'].apply(cached_add_clean_text)
+    return df_empty_subject, df_subject, df_inf
+
+
+if __name__ == "__main__":
+    start_time = time.time()
+    sizes = [0, 0, 0]
+    outputs = [paths.DATA_CLEAN_EMPTY_SUBJECT, paths.DATA_CLEAN_SUBJECT, paths.DATA_CLEAN_SUBJECT_INF]
+
+    # One pass over the data, only one chunk of rows is in memory at once
+    for first, df in read_chunks(paths.DATA_NO_DUPLICATE):
+        for k, (chunk, path) in enumerate(zip(clean_chunk(df), outputs)):
+            sizes[k] += len(chunk)
+            write_chunk(chunk, path, first)
+
+    print(f"\nThe dataset's size with empty subject: {sizes[0]}")
+    print(f"The dataset's size with subject and non-empty body: {sizes[1]}")
+    print(f"Cleaning cache: {cached_add_clean_text.cache_info()}")
+    print("\nCSV files are created!")
+    print("Time taken:", time.time() - start_time, "seconds")
@@ -1,3 +1,5 @@
+DATA_NO_DUPLICATE = 'data/no-duplicate-mails-data.csv'
+
 DATA_CLEAN_SUBJECT = 'data/clean-mails-data.csv'
 DATA_CLEAN_SUBJECT_INF = 'data/clean-mails-data-inf.csv'
 DATA_CLEAN_EMPTY_SUBJECT = 'data/clean-empty-subject-mails-data.csv'
@@ -1,3 +1,5 @@
+import os
+import sys
 import numpy as np
 import json
 import hdbscan
@@ -7,8 +9,17 @@ from scipy.cluster.hierarchy import dendrogram, linkage
 from sklearn.manifold import MDS
 from sklearn.neighbors import NearestNeighbors
 from sklearn.metrics import silhouette_score
+from scipy.sparse import load_npz
 import paths
 
+# The matrix is loaded as it is stored by the DTW stage
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dtw_distance'))
+from matrix_store import load_matrix
+
+# Use the sparse graph of the nearest chains (apply_dtw.py SPARSE) instead of the dense matrix,
+# DBSCAN gives the same clusters as long as eps is below the distances kept in the graph
+SPARSE = False
+
 def print_chains(dictionary, key, combined_path):
     '''
     Print and save the combined text from files associated with a given subject line.
@@ -29,12 +40,17 @@ def print_chains(dictionary, key, combined_path):
         print("Key not found in the dictionary.")
 
 
-dist_matrix = np.load('../' + paths.DIST_MATRIX)
+if SPARSE:
+    dist_matrix = load_npz('../' + paths.DIST_GRAPH)
+    distances = dist_matrix.data
+else:
+    dist_matrix = load_matrix('../' + paths.DIST_MATRIX, '../' + paths.DIST_MATRIX_INFO)
+    np.fill_diagonal(dist_matrix, 0)
+    distances = dist_matrix.ravel()
 dist_matrix.shape
-np.fill_diagonal(dist_matrix, 0)
 
 # distribution
-plt.hist(dist_matrix.flatten(), bins=30, edgecolor='k', alpha=0.7)
+plt.hist(distances, bins=30, edgecolor='k', alpha=0.7)
 plt.title('Distribution of Distance Values')
 plt.xlabel('Distance')
 plt.ylabel('Frequency')
@@ -60,7 +76,8 @@ for eps in eps_values:
         if len(unique_labels) > 1:
             # Mask noise points
             mask = labels != -1
-            if np.sum(mask) > 1:  # Ensure there's more than one non-noise point
+            # The silhouette score needs all the distances, not available with the sparse graph
+            if np.sum(mask) > 1 and not SPARSE:  # Ensure there's more than one non-noise point
                 score = silhouette_score(dist_matrix[mask][:, mask], labels[mask], metric='precomputed')
                 if score > best_score:
                     best_score = score
@@ -71,8 +88,9 @@ print(f"Best params: eps = {best_params['eps']}, min_samples = {best_params['min
 print(f"Best silhouette score: {best_score}")
 
 # Optional: Run DBSCAN with best params and visualize the result
-db = DBSCAN(eps=best_params['eps'], min_samples=best_params['min_samples'], metric='precomputed')
-labels = db.fit_predict(dist_matrix)
+if best_params['eps'] is not None:
+    db = DBSCAN(eps=best_params['eps'], min_samples=best_params['min_samples'], metric='precomputed')
+    labels = db.fit_predict(dist_matrix)
 
 
 
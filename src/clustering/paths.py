@@ -18,4 +18,6 @@ CHAINS_10_PLUS = 'data/chains/chains_10_plus.json'
 EMB_MAILS = 'data/mails-embeddings.csv'
 EMB_CHAINS = 'data/chains/emb-chains.json'
 
-DIST_MATRIX = 'data/distance_matrix/dist-matrix.npy'
\ No newline at end of file
+DIST_MATRIX = 'data/distance_matrix/dist-matrix.npy'
+DIST_MATRIX_INFO = 'data/distance_matrix/dist-matrix-info.json'
+DIST_GRAPH = 'data/distance_matrix/dist-graph.npz'
\ No newline at end of file
@@ -0,0 +1,159 @@
+import numpy as np
+from numba import jit, prange, get_num_threads, literally
+from dtw_numba import _cost, _max_length, _COSINE, _COSINE_NORMALIZED
+
+__all__ = ['dtw_path', 'dtw_paths']
+
+# Direction of the step into a cell of the cost matrix, 2 bits per cell
+_DIAGONAL = 0
+_UP = 1
+_LEFT = 2
+
+
+def dtw_path(series1, series2, normalized=False):
+    """
+    Computes the cosine DTW distance of two series and its warping path:
+    which timepoints (emails) of series1 are aligned with which of series2.
+
+    Args:
+        series1, series2: arrays of shape [T1, D] and [T2, D]
+        normalized: the timepoints have unit norm (see dtw_distance_ragged)
+
+    Returns:
+        The DTW distance and the path as an array of (i, j) pairs of shape
+        [path length, 2], from (0, 0) to (T1 - 1, T2 - 1)
+    """
+    series1, series2 = np.asarray(series1), np.asarray(series2)
+    offsets1 = np.array([0, len(series1)], dtype=np.int64)
+    offsets2 = np.array([0, len(series2)], dtype=np.int64)
+    distances, path_offsets, cells = dtw_paths(series1, offsets1, series2, offsets2, np.zeros((1, 2), dtype=np.int64),
+                                               normalized=normalized)
+    return distances[0], cells
+
+
+def dtw_paths(embeddings1, offsets1, embeddings2, offsets2, pairs, normalized=False, n_chunks=None):
+    """
+    Computes the DTW distance and the warping path of many pairs of series
+    of two ragged datasets (see ragged.py).
+
+    The cost matrix is kept one row at a time as in dtw_numba._dtw_row,
+    and the step taken into every cell (diagonal, up or left) is kept in
+    2 bits, 4 cells per byte, instead of the float64 cell: the traceback
+    from the last cell only needs the directions. On ties the diagonal
+    step is preferred, then up. The distances are the same as those of
+    dtw_distance_ragged, which does not pay for the directions.
+
+    Args:
+        embeddings1, offsets1: ragged dataset 1
+        embeddings2, offsets2: ragged dataset 2
+        pairs: int array of shape [P, 2] of (series of dataset 1, series of dataset 2)
+        normalized: the timepoints have unit norm (see dtw_distance_ragged)
+        n_chunks: number of ranges of pairs, the number of threads by default
+
+    Returns:
+        distances of shape [P], and the paths in the ragged layout: the
+        path of pair p is cells[path_offsets[p]:path_offsets[p + 1]], an
+        int32 array of (i, j) pairs of shape [path length, 2]
+    """
+    if n_chunks is None:
+        n_chunks = get_num_threads()
+    offsets1 = np.asarray(offsets1, dtype=np.int64)
+    offsets2 = np.asarray(offsets2, dtype=np.int64)
+    pairs = np.ascontiguousarray(pairs, dtype=np.int64).reshape(-1, 2)
+    metric = _COSINE_NORMALIZED if normalized else _COSINE
+
+    # Every path has at most T1 + T2 - 1 cells, it is written in that slot and compacted after
+    lengths1 = offsets1[pairs[:, 0] + 1] - offsets1[pairs[:, 0]]
+    lengths2 = offsets2[pairs[:, 1] + 1] - offsets2[pairs[:, 1]]
+    slots = np.zeros(len(pairs) + 1, dtype=np.int64)
+    np.cumsum(lengths1 + lengths2 - 1, out=slots[1:])
+
+    distances, path_lengths, cells = _dtw_paths(embeddings1, offsets1, embeddings2, offsets2, pairs,
+                                                metric, n_chunks, slots)
+
+    path_offsets = np.zeros(len(pairs) + 1, dtype=np.int64)
+    np.cumsum(path_lengths, out=path_offsets[1:])
+    index = np.repeat(slots[:-1] - path_offsets[:-1], path_lengths) + np.arange(path_offsets[-1])
+    return distances, path_offsets, cells[index]
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _dtw_paths(embeddings1, offsets1, embeddings2, offsets2, pairs, metric, n_chunks, slots):
+    literally(metric)
+    n_pairs = pairs.shape[0]
+    max_length1 = _max_length(offsets1)
+    max_length2 = _max_length(offsets2)
+
+    distances = np.empty(n_pairs, dtype=np.float64)
+    path_lengths = np.empty(n_pairs, dtype=np.int64)
+    cells = np.empty((slots[n_pairs], 2), dtype=np.int32)
+
+    for chunk in prange(n_chunks):
+        # Scratch buffers of the thread, reused for all the pairs of the chunk
+        row = np.empty(max(max_length2, 1))
+        directions = np.empty((max_length1 * max_length2 + 3) // 4, dtype=np.uint8)
+        for p in range(chunk * n_pairs // n_chunks, (chunk + 1) * n_pairs // n_chunks):
+            i, j = pairs[p, 0], pairs[p, 1]
+            distances[p], path_lengths[p] = _dtw_row_path(embeddings1[offsets1[i]:offsets1[i + 1]],
+                                                          embeddings2[offsets2[j]:offsets2[j + 1]], metric,
+                                                          row, directions, cells[slots[p]:slots[p + 1]])
+    return distances, path_lengths, cells
+
+
+@jit(nopython=True, cache=True)
+def _dtw_row_path(series1, series2, metric, row, directions, path):
+    """
+    Same as dtw_numba._dtw_row, also keeping the direction of every cell
+    in directions, then writes the path in path. Returns the distance and
+    the length of the path.
+    """
+    l1, l2 = series1.shape[0], series2.shape[0]
+
+    row[0] = _cost(metric, series1[0], series2[0])
+    for j in range(1, l2):
+        row[j] = row[j - 1] + _cost(metric, series1[0], series2[j])
+        _set_direction(directions, j, _LEFT)
+
+    for i in range(1, l1):
+        diagonal = row[0]
+        row[0] = diagonal + _cost(metric, series1[i], series2[0])
+        _set_direction(directions, i * l2, _UP)
+        for j in range(1, l2):
+            up = row[j]
+            left = row[j - 1]
+            if diagonal <= up and diagonal <= left:
+                best, direction = diagonal, _DIAGONAL
+            elif up <= left:
+                best, direction = up, _UP
+            else:
+                best, direction = left, _LEFT
+            row[j] = _cost(metric, series1[i], series2[j]) + best
+            _set_direction(directions, i * l2 + j, direction)
+            diagonal = up
+
+    # Traceback from the last cell, the path is written backwards then reversed
+    i, j = l1 - 1, l2 - 1
+    n = 0
+    while True:
+        path[n, 0], path[n, 1] = i, j
+        n += 1
+        if i == 0 and j == 0:
+            break
+        direction = (directions[(i * l2 + j) >> 2] >> (((i * l2 + j) & 3) * 2)) & 3
+        if direction == _DIAGONAL:
+            i, j = i - 1, j - 1
+        elif direction == _UP:
+            i = i - 1
+        else:
+            j = j - 1
+    for k in range(n // 2):
+        path[k, 0], path[n - 1 - k, 0] = path[n - 1 - k, 0], path[k, 0]
+        path[k, 1], path[n - 1 - k, 1] = path[n - 1 - k, 1], path[k, 1]
+
+    return row[l2 - 1], n
+
+
+@jit(nopython=True, cache=True)
+def _set_direction(directions, cell, direction):
+    shift = (cell & 3) * 2
+    directions[cell >> 2] = (directions[cell >> 2] & ~np.uint8(3 << shift)) | np.uint8(direction << shift)
@@ -1,26 +1,154 @@
 import numpy as np
-from dtw_numba import dtw_distance, _cosine
+from dtw_numba import dtw_pdist_ragged, squareform
+from dtw_blas import dtw_pdist_blas
+from ragged import from_embedding_store, normalize
+from tiled import run_tiled_dtw, input_fingerprint
+from fastdtw import fastdtw_pdist
+from sparse_graph import dtw_knn_graph, dtw_radius_graph, save_graph
+from candidates import chain_summaries, build_ivf, search_ivf, dtw_candidate_graph
+from incremental import chain_keys, load_keys, save_keys, update_distance_matrix
+from matrix_store import encode_matrix, save_matrix_info, load_matrix_info
+import os
+import sys
 import time
 import json
 import paths
 
-with open(paths.EMB_CHAINS, 'r') as file:
-    emb_chains = json.load(file)
-    
-time_series_set = list(emb_chains.values())
+# The chain rows are saved by the embeddings stage
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'for_embeddings'))
+from embedding_store import load_chain_rows
 
-# Convert the innermost lists to numpy arrays
-time_series_set = [np.array([np.array(inner_list) for inner_list in outer_list]) for outer_list in time_series_set]
+# L2-normalize the embeddings once, the cosine distance is then a single dot product
+NORMALIZE = True
 
+# Cost of two emails: 'cosine', 'euclidean', 'sqeuclidean' or 'inner' (see dtw_numba.dtw_distance).
+# The other metrics are computed on the raw embeddings (NORMALIZE is ignored) by the non-tiled exact
+# run (TILED is ignored), they need SPARSE and INCREMENTAL off and the 'exact' ENGINE
+METRIC = 'cosine'
+
+# Compute the matrix tile by tile into the file on disk, an interrupted run resumes from the manifest
+TILED = True
+
+# 'exact' DTW, or 'fastdtw' for the approximate multiresolution DTW (exploratory runs)
+ENGINE = 'exact'
+
+# Radius of FastDTW, see fastdtw_report.py for its error on the chains
+FASTDTW_RADIUS = 1
+
+# Save a sparse graph (DIST_GRAPH) instead of the dense matrix: the GRAPH_NEIGHBORS nearest chains
+# of every chain, or all the pairs closer than GRAPH_MAX_DISTANCE if it is set
+SPARSE = False
+GRAPH_NEIGHBORS = 30
+GRAPH_MAX_DISTANCE = None
+
+# With SPARSE, search the neighbours by DTW only among the GRAPH_CANDIDATES chains with the closest
+# summaries (IVF index probing GRAPH_PROBES lists), None for all the chains (see candidates_report.py)
+GRAPH_CANDIDATES = None
+GRAPH_PROBES = 8
+
+# Reuse the distances of the previous dense matrix between the chains it already had (same emails),
+# only the rows and columns of the new chains are computed
+INCREMENTAL = False
+
+# Type of the saved dense matrix: 'float32' halves the disk and memory of 'float64', 'float16' and
+# 'uint16' (codes times a scale, see matrix_store.py) divide them by 4
+MATRIX_DTYPE = 'float32'
+
+# The matrix is computed in float32 (float64 if asked) and encoded once complete
+COMPUTE_DTYPE = np.float64 if MATRIX_DTYPE == 'float64' else np.float32
+
+if METRIC != 'cosine':
+    if SPARSE or INCREMENTAL or ENGINE != 'exact':
+        raise ValueError(f"The {METRIC!r} metric needs SPARSE and INCREMENTAL off and the 'exact' engine")
+    # On unit vectors the other metrics would only be functions of the cosine,
+    # and the tiled job computes the cosine DTW only
+    NORMALIZE = False
+    TILED = False
+
+# Embeddings of all the emails as one float32 matrix, memory-mapped from disk
+emb_matrix = np.load('../' + paths.EMB_MATRIX, mmap_mode='r')
+
+# The chains are offsets into an array of row ids of the matrix
+rows, offsets = load_chain_rows('../' + paths.EMB_CHAINS_ROWS)
+
+# The chains are identified across runs by their email files, the rows change with the store
+with open('../' + paths.EMB_INDEX, 'r') as file:
+    keys = chain_keys(rows, offsets, json.load(file))
+old_keys = load_keys('../' + paths.DIST_KEYS) if INCREMENTAL and not SPARSE else None
+
+# Gather the chains into the ragged layout: one memory-mapped [n_chain_emails, D] array
+# and the offsets of the chains, the DTW works on views of it
+embeddings, offsets = from_embedding_store(emb_matrix, rows, offsets, path='../' + paths.EMB_CHAINS_RAGGED)
+np.save('../' + paths.EMB_CHAINS_OFFSETS, offsets)
+
+if NORMALIZE:
+    # Written to disk and memory-mapped as the ragged array, so it is never held in memory
+    embeddings = normalize(embeddings, path='../' + paths.EMB_CHAINS_NORMALIZED)
+
+
+# A new matrix is computed, the keys and type of the previous one no longer describe it
+if not SPARSE and old_keys is None:
+    for path in (paths.DIST_KEYS, paths.DIST_MATRIX_INFO):
+        if os.path.exists('../' + path):
+            os.remove('../' + path)
 
 start_time = time.time()
-res_numba = dtw_distance(time_series_set, time_series_set)
+if SPARSE:
+    if GRAPH_CANDIDATES is not None:
+        summaries = chain_summaries(embeddings, offsets)
+        candidates = search_ivf(summaries, build_ivf(summaries), GRAPH_CANDIDATES, GRAPH_PROBES)
+        graph = dtw_candidate_graph(embeddings, offsets, candidates, GRAPH_NEIGHBORS, normalized=NORMALIZE)
+    elif GRAPH_MAX_DISTANCE is None:
+        graph = dtw_knn_graph(embeddings, offsets, GRAPH_NEIGHBORS, normalized=NORMALIZE)
+    else:
+        graph = dtw_radius_graph(embeddings, offsets, GRAPH_MAX_DISTANCE, normalized=NORMALIZE)
+    save_graph('../' + paths.DIST_GRAPH, graph)
+    complete = False
+    print(f"The graph of {graph.nnz} distances is saved in dist-graph.npz file!")
+elif old_keys is not None:
+    res_numba, n_added = update_distance_matrix(embeddings, offsets, keys, old_keys, '../' + paths.DIST_MATRIX,
+                                                normalized=NORMALIZE,
+                                                info=load_matrix_info('../' + paths.DIST_MATRIX,
+                                                                      '../' + paths.DIST_MATRIX_INFO))
+    # The matrix no longer matches the manifest of the tiled job it came from
+    if os.path.exists('../' + paths.DIST_MANIFEST):
+        os.remove('../' + paths.DIST_MANIFEST)
+    complete = True
+    print(f"{n_added} new chains of {len(keys)}")
+elif ENGINE == 'fastdtw':
+    condensed = fastdtw_pdist(embeddings, offsets, radius=FASTDTW_RADIUS, normalized=NORMALIZE)
+    res_numba = squareform(condensed.astype(COMPUTE_DTYPE))
+    complete = True
+elif TILED:
+    res_numba, complete = run_tiled_dtw(embeddings, offsets, embeddings, offsets, '../' + paths.DIST_MATRIX,
+                                        '../' + paths.DIST_MANIFEST, normalized=NORMALIZE, symmetric=True,
+                                        dtype=COMPUTE_DTYPE,
+                                        fingerprint=input_fingerprint(offsets, keys, ['../' + paths.EMB_MATRIX]))
+else:
+    # The distance is symmetric, only the pairs i < j are computed (condensed array)
+    if NORMALIZE and METRIC == 'cosine':
+        # Local cost matrices from one matrix product per block of chains
+        condensed = dtw_pdist_blas(embeddings, offsets)
+    else:
+        condensed = dtw_pdist_ragged(embeddings, offsets, metric=METRIC)
+    res_numba = squareform(condensed.astype(COMPUTE_DTYPE))
+    complete = True
 end_time = time.time()
 time_taken = end_time - start_time
 print(f"Time taken: {time_taken:.2f} seconds")
 
-np.save('../' + paths.DIST_MATRIX, res_numba)
-
-print("The result is saved in dist-matrix.npy file!")
+if complete:
+    if isinstance(res_numba, np.memmap) and res_numba.dtype == MATRIX_DTYPE:
+        # Already written in its type by the tiled job or the incremental update
+        save_matrix_info('../' + paths.DIST_MATRIX_INFO, {'dtype': MATRIX_DTYPE, 'scale': None, 'offset': None})
+    else:
+        encode_matrix(res_numba, '../' + paths.DIST_MATRIX, '../' + paths.DIST_MATRIX_INFO, MATRIX_DTYPE)
+        # A manifest left by an interrupted tiled job no longer describes the matrix
+        if os.path.exists('../' + paths.DIST_MANIFEST):
+            os.remove('../' + paths.DIST_MANIFEST)
+    # Only the exact distances are reused by the next incremental run
+    if ENGINE == 'exact':
+        save_keys('../' + paths.DIST_KEYS, keys)
+    print("The result is saved in dist-matrix.npy file!")
 
-#loaded_array = np.load('dist-matrix.npy')
\ No newline at end of file
+#loaded_array = np.load('dist-matrix.npy')
@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import json
+import platform
+import tracemalloc
+import numpy as np
+import numba
+from multiprocessing import get_context
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from numba import set_num_threads
+import paths
+import dtw
+import parallel
+from dtw_numba_try import dtw_distance_mine
+from dtw_numba import dtw_pdist_ragged
+from dtw_blas import dtw_pdist_blas
+from schedule import dtw_distance_scheduled
+from ragged import normalize
+
+# Number of chains of the benchmarked sets, the DTW of all their pairs is computed
+SIZES = [100, 500]
+
+# Embedding sizes and types of the benchmarked sets
+DIMS = [384, 768]
+DTYPES = [np.float32, np.float64]
+
+# Thread counts, the Numba ones run with set_num_threads
+THREADS = sorted({1, numba.config.NUMBA_NUM_THREADS})
+
+# The pure Python implementations only get the first chains of every set
+PYTHON_SIZE = 30
+
+# Chains of 5-14 emails as in the scripts, plus a share of long chains with a geometric tail
+MIN_LENGTH, MAX_LENGTH = 5, 15
+LONG_SHARE = 0.05
+LONG_MEAN = 15
+LONG_MAX = 80
+
+# Timed runs of every benchmark, the best one is kept
+REPEATS = 3
+
+# Number of chains checked against the reference implementations
+CHECK_SIZE = 20
+CHECK_TOLERANCE = {'float32': 1e-3, 'float64': 1e-5}
+
+# Pairs per second below this share of the previous report are flagged
+REGRESSION_RATIO = 0.8
+
+
+def synthetic_chains(n, dim, dtype, seed=0):
+    '''
+    Generates a ragged set of chains with the length distribution of the emails chains.
+
+    Args:
+    - n (int): Number of chains.
+    - dim (int): Embedding size.
+    - dtype (numpy.dtype): Type of the embeddings.
+    - seed (int): Seed of the generator.
+
+    Returns:
+    - tuple: Embeddings of shape [sum T, dim] and int64 offsets of shape [n + 1].
+    '''
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(MIN_LENGTH, MAX_LENGTH, n)
+    long = rng.random(n) < LONG_SHARE
+    lengths[long] = np.minimum(MAX_LENGTH + rng.geometric(1.0 / LONG_MEAN, long.sum()), LONG_MAX)
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    embeddings = rng.random((offsets[-1], dim)).astype(dtype)
+    return embeddings, offsets
+
+def python_pdist(distance, embeddings, offsets, n_threads=1):
+    '''
+    Computes the condensed distances of all the pairs i < j with a Python DTW function,
+    in a pool of n_threads threads as parallel.py does if n_threads > 1.
+    '''
+    n = len(offsets) - 1
+    series = [embeddings[offsets[i]:offsets[i + 1]] for i in range(n)]
+    pairs = [(i, j) for i in range(n) for j in range(i + 1, n)]
+    if n_threads == 1:
+        return np.array([distance(series[i], series[j]) for i, j in pairs])
+    with ThreadPoolExecutor(n_threads) as pool:
+        return np.array(list(pool.map(lambda pair: distance(series[pair[0]], series[pair[1]]), pairs)))
+
+def scheduled_pdist(embeddings, offsets, n_threads):
+    dist = dtw_distance_scheduled(embeddings, offsets, embeddings, offsets, normalized=True,
+                                  symmetric=True, n_threads=n_threads)
+    return dist[np.triu_indices(len(offsets) - 1, 1)]
+
+# Benchmarked implementations: function of (embeddings, normalized embeddings, offsets, threads)
+# returning the condensed distances, metric, and whether it is pure Python
+IMPLEMENTATIONS = {
+    'dtw.py': (lambda e, en, o, t: python_pdist(dtw.dtw_distance, e, o), 'euclidean', True),
+    'parallel.py': (lambda e, en, o, t: python_pdist(parallel.dtw_distance, e, o, t), 'euclidean', True),
+    'dtw_numba_try.py': (lambda e, en, o, t: python_pdist(dtw_distance_mine, e, o), 'cosine', True),
+    'dtw_numba': (lambda e, en, o, t: dtw_pdist_ragged(e, o), 'cosine', False),
+    'dtw_numba euclidean': (lambda e, en, o, t: dtw_pdist_ragged(e, o, metric='euclidean'), 'euclidean', False),
+    'dtw_numba normalized': (lambda e, en, o, t: dtw_pdist_ragged(en, o, normalized=True), 'cosine', False),
+    'dtw_blas': (lambda e, en, o, t: dtw_pdist_blas(en, o), 'cosine', False),
+    'schedule': (lambda e, en, o, t: scheduled_pdist(en, o, t), 'cosine', False),
+}
+
+# Reference of every metric for the correctness check
+REFERENCES = {'euclidean': dtw.dtw_distance, 'cosine': dtw_distance_mine}
+
+def peak_memory_mb():
+    '''
+    Returns the peak resident memory of the process in MB, None where it is not available.
+    It only grows over the life of the process, see isolated_benchmark.
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def run_benchmark(name, embeddings, normalized, offsets, n_threads):
+    '''
+    Times one implementation on one set of chains.
+
+    Args:
+    - name (str): Key of the implementation in IMPLEMENTATIONS.
+    - embeddings, normalized (numpy.ndarray): Raw and L2-normalized embeddings of the chains.
+    - offsets (numpy.ndarray): Offsets of the chains.
+    - n_threads (int): Number of threads.
+
+    Returns:
+    - dict: Best time, pairs per second, memory and correctness of the implementation. The memory
+      (numpy_peak_mb) is the peak traced by tracemalloc: the NumPy arrays allocated by Python code,
+      not the scratch buffers and arrays allocated inside the Numba kernels (NRT).
+    '''
+    function, metric, pure_python = IMPLEMENTATIONS[name]
+    set_num_threads(n_threads)
+
+    # Check on the first chains, which also compiles the kernels before the timings
+    check_offsets = offsets[:CHECK_SIZE + 1]
+    result = function(embeddings, normalized, check_offsets, n_threads)
+    reference = python_pdist(REFERENCES[metric], embeddings, check_offsets)
+    error = float(np.max(np.abs(result - reference))) if len(reference) else 0.0
+
+    if pure_python:
+        offsets = offsets[:PYTHON_SIZE + 1]
+    n = len(offsets) - 1
+    seconds = np.inf
+    for _ in range(1 if pure_python else REPEATS):
+        start_time = time.perf_counter()
+        function(embeddings, normalized, offsets, n_threads)
+        seconds = min(seconds, time.perf_counter() - start_time)
+
+    # Memory of a separate run, tracemalloc slows the Python code down several times
+    tracemalloc.start()
+    function(embeddings, normalized, offsets, n_threads)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    pairs = n * (n - 1) // 2
+    return {'n': n, 'pairs': pairs, 'seconds': seconds, 'pairs_per_second': pairs / seconds,
+            'numpy_peak_mb': traced_peak / 2**20, 'max_error': error, 'correct': error <= CHECK_TOLERANCE[np.dtype(embeddings.dtype).name]}
+
+def isolated_benchmark(name, n, dim, dtype, n_threads):
+    '''
+    Runs one benchmark (run_benchmark) on a new set of chains in a new process, so that the peak
+    resident memory of the process (process_peak_mb) is the one of this benchmark only.
+
+    Returns:
+    - dict: Result of run_benchmark with the peak resident memory of the process.
+    '''
+    with ProcessPoolExecutor(1, mp_context=get_context('spawn')) as pool:
+        return pool.submit(_run_in_process, name, n, dim, dtype, n_threads).result()
+
+def _run_in_process(name, n, dim, dtype, n_threads):
+    embeddings, offsets = synthetic_chains(n, dim, dtype)
+    normalized = normalize(embeddings, dtype=dtype)
+    result = run_benchmark(name, embeddings, normalized, offsets, n_threads)
+    result['process_peak_mb'] = peak_memory_mb()
+    return result
+
+def compare_reports(results, previous):
+    '''Prints the benchmarks with fewer pairs per second than REGRESSION_RATIO times the previous report.'''
+    before = {(r['implementation'], r['n'], r['dim'], r['dtype'], r['threads']): r for r in previous['results']}
+    for r in results:
+        old = before.get((r['implementation'], r['n'], r['dim'], r['dtype'], r['threads']))
+        if old is not None and r['pairs_per_second'] < REGRESSION_RATIO * old['pairs_per_second']:
+            print(f"Regression: {r['implementation']} n={r['n']} dim={r['dim']} {r['dtype']} "
+                  f"{r['threads']} threads, {old['pairs_per_second']:.0f} -> {r['pairs_per_second']:.0f} pairs/s")
+
+
+if __name__ == "__main__":
+
+    results = []
+    for n in SIZES:
+        for dim in DIMS:
+            for dtype in DTYPES:
+                for name, (_, _, pure_python) in IMPLEMENTATIONS.items():
+                    # The pure Python implementations run on the same first chains of every size
+                    if pure_python and n != SIZES[0]:
+                        continue
+                    for n_threads in THREADS:
+                        if name in ('dtw.py', 'dtw_numba_try.py') and n_threads > 1:
+                            continue
+                        result = isolated_benchmark(name, n, dim, dtype, n_threads)
+                        result.update({'implementation': name, 'dim': dim, 'dtype': np.dtype(dtype).name,
+                                       'threads': n_threads})
+                        results.append(result)
+                        print(f"{name:22} n={result['n']:4} dim={dim} {result['dtype']} {n_threads} threads: "
+                              f"{result['pairs_per_second']:10.0f} pairs/s, max error {result['max_error']:.1e}"
+                              f"{'' if result['correct'] else ' WRONG'}")
+
+    report = {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(),
+              'numpy': np.__version__, 'numba': numba.__version__, 'machine': platform.machine(),
+              'cpus': os.cpu_count(), 'results': results}
+
+    if os.path.exists('../' + paths.BENCHMARK_REPORT):
+        with open('../' + paths.BENCHMARK_REPORT, 'r') as file:
+            compare_reports(results, json.load(file))
+
+    with open('../' + paths.BENCHMARK_REPORT, 'w') as file:
+        json.dump(report, file, indent=4)
+
+    print("The benchmark is saved in benchmark.json file!")
@@ -0,0 +1,256 @@
+import numpy as np
+from numba import jit, prange, literally
+from scipy.sparse import csr_matrix
+from dtw_numba import _max_length, _cost, _COSINE, _COSINE_NORMALIZED
+from lower_bounds import _dtw_row_abandon
+from sparse_graph import _sift_down
+
+__all__ = ['chain_summaries', 'build_ivf', 'search_ivf', 'dtw_candidate_graph', 'recall_at_k']
+
+# Number of length bins of the chain summaries, each with the mean of its part of the chain
+N_BINS = 2
+
+# Dimension the summaries are reduced to, None keeps all of them
+SUMMARY_DIM = 128
+
+# Number of Lloyd iterations of the k-means of the IVF index
+KMEANS_ITERATIONS = 10
+
+# Number of summaries multiplied at once
+BLOCK_SIZE = 65536
+
+
+def chain_summaries(embeddings, offsets, n_bins=N_BINS, dim=SUMMARY_DIM, seed=0):
+    """
+    Summarizes every chain of a ragged dataset (see ragged.py) by one unit
+    vector: the L2-normalized mean, first and last embeddings of the chain
+    and the means of its n_bins consecutive parts of equal length,
+    concatenated. The inner product of two summaries is the mean of the
+    cosines of their parts, a cheap proxy of the DTW similarity.
+
+    Args:
+        embeddings, offsets: ragged dataset, N series
+        n_bins: number of length bins
+        dim: the summaries are projected on their dim first principal
+            directions (fitted on a sample) and normalized again, None
+            keeps the 3 + n_bins embedding sizes
+        seed: seed of the sample of the projection
+
+    Returns:
+        float32 array of shape [N, dim]
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n, d = len(offsets) - 1, embeddings.shape[1]
+    n_parts = 3 + n_bins
+    summaries = np.empty((n, n_parts * d), dtype=np.float32)
+
+    for start in range(0, n, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n)
+        block = np.asarray(embeddings[offsets[start]:offsets[stop]], dtype=np.float64)
+        summaries[start:stop] = _summarize(block, offsets[start:stop + 1] - offsets[start], n_bins)
+
+    if dim is not None and dim < summaries.shape[1]:
+        rng = np.random.default_rng(seed)
+        sample = summaries[rng.choice(n, min(n, 10000), replace=False)]
+        _, _, vt = np.linalg.svd(sample, full_matrices=False)
+        projection = vt[:dim].astype(np.float32)
+        summaries = np.concatenate([summaries[s:s + BLOCK_SIZE] @ projection.T for s in range(0, n, BLOCK_SIZE)])
+        summaries /= np.maximum(np.linalg.norm(summaries, axis=1, keepdims=True), 1e-12)
+    return np.ascontiguousarray(summaries)
+
+
+def build_ivf(summaries, n_lists=None, n_iterations=KMEANS_ITERATIONS, seed=0):
+    """
+    Builds an inverted file index of unit summaries: a spherical k-means
+    splits them into n_lists lists, a query only searches the lists of
+    the centroids nearest to it.
+
+    Args:
+        summaries: unit vectors of shape [N, dim]
+        n_lists: number of lists, about sqrt(N) by default
+        n_iterations: number of k-means iterations
+
+    Returns:
+        Dict of the centroids of shape [n_lists, dim] and of the lists in
+        the CSR layout: the ids of list l are ids[list_offsets[l]:list_offsets[l + 1]]
+    """
+    n = len(summaries)
+    if n_lists is None:
+        n_lists = max(1, int(np.sqrt(n)))
+    n_lists = min(n_lists, n)
+    rng = np.random.default_rng(seed)
+    centroids = summaries[rng.choice(n, n_lists, replace=False)].copy()
+
+    for _ in range(n_iterations):
+        assignment = _nearest_centroids(summaries, centroids)
+        sums = _group_sums(assignment, summaries, n_lists)
+        norms = np.linalg.norm(sums, axis=1)
+        empty = norms == 0
+        # Empty lists get a random summary as new centroid
+        sums[empty] = summaries[rng.choice(n, empty.sum(), replace=False)]
+        norms[empty] = 1.0
+        centroids = (sums / norms[:, None]).astype(summaries.dtype)
+
+    assignment = _nearest_centroids(summaries, centroids)
+    ids = np.argsort(assignment, kind='stable').astype(np.int64)
+    list_offsets = np.zeros(n_lists + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=n_lists), out=list_offsets[1:])
+    return {'centroids': centroids, 'ids': ids, 'list_offsets': list_offsets}
+
+
+def search_ivf(summaries, index, n_candidates, n_probe=8):
+    """
+    Returns the n_candidates summaries of the index with the largest inner
+    product with every summary, among the n_probe lists of its nearest
+    centroids, the summary itself excluded (the queries are the indexed
+    summaries).
+
+    Returns:
+        int64 array of shape [N, n_candidates], -1 where fewer candidates
+        were found in the probed lists
+    """
+    n_probe = min(n_probe, len(index['centroids']))
+    probes = np.empty((len(summaries), n_probe), dtype=np.int64)
+    for start in range(0, len(summaries), BLOCK_SIZE):
+        similarity = summaries[start:start + BLOCK_SIZE] @ index['centroids'].T
+        probes[start:start + BLOCK_SIZE] = np.argsort(-similarity, axis=1)[:, :n_probe]
+    return _search_lists(summaries, probes, index['ids'], index['list_offsets'], n_candidates)
+
+
+def dtw_candidate_graph(embeddings, offsets, candidates, n_neighbors, normalized=False):
+    """
+    Computes the graph of the n_neighbors nearest chains of every chain by
+    DTW, searched only among its candidates (search_ivf), in the format
+    of sparse_graph.dtw_knn_graph.
+
+    Args:
+        embeddings, offsets: ragged dataset, N series
+        candidates: candidates of every chain of shape [N, n_candidates]
+        n_neighbors: number of neighbours per chain, at most n_candidates
+        normalized: the timepoints have unit norm (see dtw_distance_ragged)
+
+    Returns:
+        scipy.sparse.csr_matrix of shape [N, N]
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = len(offsets) - 1
+    n_neighbors = min(n_neighbors, candidates.shape[1])
+    metric = _COSINE_NORMALIZED if normalized else _COSINE
+
+    distances, indices = _candidate_heaps(embeddings, offsets, metric, n_neighbors, candidates)
+
+    # Rows with fewer candidates than neighbours keep only the found ones
+    found = indices >= 0
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(found.sum(axis=1), out=indptr[1:])
+    return csr_matrix((distances[found], indices[found], indptr), shape=(n, n))
+
+
+def recall_at_k(graph, exact_graph):
+    """
+    Returns the share of the neighbours of the exact graph (dtw_knn_graph)
+    found in the approximate graph, for graphs with the same number of
+    neighbours per row.
+    """
+    found = 0
+    for i in range(exact_graph.shape[0]):
+        exact = exact_graph.indices[exact_graph.indptr[i]:exact_graph.indptr[i + 1]]
+        approx = graph.indices[graph.indptr[i]:graph.indptr[i + 1]]
+        found += len(np.intersect1d(exact, approx))
+    return found / max(exact_graph.nnz, 1)
+
+
+def _summarize(block, offsets, n_bins):
+    """Summaries of the chains of a block, see chain_summaries."""
+    n = len(offsets) - 1
+    unit = block / np.maximum(np.linalg.norm(block, axis=1, keepdims=True), 1e-12)
+    lengths = np.diff(offsets)
+    chain_ids = np.repeat(np.arange(n), lengths)
+    positions = np.arange(len(unit)) - np.repeat(offsets[:-1], lengths)
+
+    parts = [np.add.reduceat(unit, offsets[:-1], axis=0) / lengths[:, None],
+             unit[offsets[:-1]],
+             unit[offsets[1:] - 1]]
+    # Bin b of a chain of length T holds its timepoints t with t * n_bins // T == b
+    bins = positions * n_bins // np.repeat(lengths, lengths)
+    for b in range(n_bins):
+        mask = bins == b
+        sums = _group_sums(chain_ids[mask], unit[mask], n)
+        # Chains shorter than n_bins have empty bins, they take the mean of the chain
+        counts = np.bincount(chain_ids[mask], minlength=n)
+        parts.append(np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], parts[0]))
+
+    parts = [part / np.maximum(np.linalg.norm(part, axis=1, keepdims=True), 1e-12) for part in parts]
+    return np.concatenate(parts, axis=1) / np.sqrt(len(parts))
+
+
+def _group_sums(groups, values, n_groups):
+    """Sums of the rows of values by group, as a product with the one-hot matrix of the groups."""
+    one_hot = csr_matrix((np.ones(len(groups)), (groups, np.arange(len(groups)))), shape=(n_groups, len(groups)))
+    return np.asarray(one_hot @ values, dtype=np.float64)
+
+
+def _nearest_centroids(summaries, centroids):
+    assignment = np.empty(len(summaries), dtype=np.int64)
+    for start in range(0, len(summaries), BLOCK_SIZE):
+        assignment[start:start + BLOCK_SIZE] = np.argmax(summaries[start:start + BLOCK_SIZE] @ centroids.T, axis=1)
+    return assignment
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _search_lists(summaries, probes, ids, list_offsets, k):
+    n = summaries.shape[0]
+    candidates = np.full((n, k), -1, dtype=np.int64)
+
+    for q in prange(n):
+        # Min-heap of the similarities as a max-heap of their opposites
+        heap_distances = np.full(k, np.inf)
+        heap_indices = np.full(k, -1, dtype=np.int64)
+        for p in range(probes.shape[1]):
+            l = probes[q, p]
+            for t in range(list_offsets[l], list_offsets[l + 1]):
+                j = ids[t]
+                if j == q:
+                    continue
+                d = -np.dot(summaries[q], summaries[j])
+                if d < heap_distances[0]:
+                    heap_distances[0] = d
+                    heap_indices[0] = j
+                    _sift_down(heap_distances, heap_indices)
+        order = np.argsort(heap_distances)
+        candidates[q] = heap_indices[order]
+    return candidates
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _candidate_heaps(embeddings, offsets, metric, k, candidates):
+    """
+    Same as sparse_graph._knn_heaps with only the candidates of every row.
+    """
+    literally(metric)
+    n = offsets.shape[0] - 1
+    max_length = _max_length(offsets)
+
+    distances = np.empty((n, k))
+    indices = np.empty((n, k), dtype=np.int64)
+
+    for i in prange(n):
+        row = np.empty(max(max_length, 1))
+        heap_distances = np.full(k, np.inf)
+        heap_indices = np.full(k, -1, dtype=np.int64)
+        series1 = embeddings[offsets[i]:offsets[i + 1]]
+
+        for c in range(candidates.shape[1]):
+            j = candidates[i, c]
+            if j < 0 or k == 0:
+                continue
+            d = _dtw_row_abandon(series1, embeddings[offsets[j]:offsets[j + 1]], metric, row, heap_distances[0])
+            if d < heap_distances[0]:
+                heap_distances[0] = d
+                heap_indices[0] = j
+                _sift_down(heap_distances, heap_indices)
+
+        order = np.argsort(heap_distances)
+        distances[i] = heap_distances[order]
+        indices[i] = heap_indices[order]
+    return distances, indices
@@ -0,0 +1,55 @@
+import numpy as np
+import time
+import json
+import paths
+from candidates import chain_summaries, build_ivf, search_ivf, dtw_candidate_graph, recall_at_k
+from sparse_graph import dtw_knn_graph
+from fastdtw_report import sample_chains
+from ragged import load_ragged, normalize
+
+# Number of chains sampled, the exact nearest neighbours of all of them are computed
+SAMPLE_SIZE = 5000
+
+# Number of neighbours of the recall@k
+N_NEIGHBORS = 10
+
+# Settings compared: number of candidates per chain and number of probed lists
+N_CANDIDATES = [50, 100, 200]
+N_PROBES = [4, 8, 16]
+
+
+if __name__ == "__main__":
+
+    embeddings, offsets = load_ragged('../' + paths.EMB_CHAINS_RAGGED, '../' + paths.EMB_CHAINS_OFFSETS)
+    embeddings, offsets = sample_chains(embeddings, offsets, SAMPLE_SIZE)
+    embeddings = normalize(embeddings)
+    print(f"{len(offsets) - 1} chains sampled")
+
+    # Compile the kernels before the timings
+    dtw_knn_graph(embeddings, offsets[:4], 1, normalized=True)
+    dtw_candidate_graph(embeddings, offsets[:4], np.zeros((3, 1), dtype=np.int64), 1, normalized=True)
+
+    start_time = time.time()
+    exact = dtw_knn_graph(embeddings, offsets, N_NEIGHBORS, normalized=True)
+    report = {'chains': len(offsets) - 1, 'k': N_NEIGHBORS, 'exact_seconds': time.time() - start_time}
+
+    start_time = time.time()
+    summaries = chain_summaries(embeddings, offsets)
+    index = build_ivf(summaries)
+    report['index_seconds'] = time.time() - start_time
+    report['settings'] = []
+
+    for n_candidates in N_CANDIDATES:
+        for n_probe in N_PROBES:
+            start_time = time.time()
+            candidates = search_ivf(summaries, index, n_candidates, n_probe)
+            graph = dtw_candidate_graph(embeddings, offsets, candidates, N_NEIGHBORS, normalized=True)
+            result = {'n_candidates': n_candidates, 'n_probe': n_probe,
+                      'seconds': time.time() - start_time, 'recall': recall_at_k(graph, exact)}
+            report['settings'].append(result)
+            print(json.dumps(result))
+
+    with open('../' + paths.CANDIDATES_REPORT, 'w') as file:
+        json.dump(report, file, indent=4)
+
+    print("The report is saved in candidates-report.json file!")
@@ -30,40 +30,42 @@ def dtw_distance(series1, series2):
     # The DTW distance is the value at the bottom-right corner of the matrix
     return dtw_matrix[n, m]
 
-# Generate a set of 100 random time series with elements as vectors of length 768
-np.random.seed(0)  # For reproducibility
-time_series_set = [np.random.rand(np.random.randint(5, 15), 768) for _ in range(1800)]
+if __name__ == "__main__":
 
-with open('time_series.csv', 'w', newline='') as csvfile:
-    writer = csv.writer(csvfile)
-    writer.writerow(['Index', 'Time Series'])
-    for idx, series in enumerate(time_series_set):
-        writer.writerow([idx, series.tolist()])
+    # Generate a set of 100 random time series with elements as vectors of length 768
+    np.random.seed(0)  # For reproducibility
+    time_series_set = [np.random.rand(np.random.randint(5, 15), 768) for _ in range(1800)]
 
-df = pd.read_csv('time_series.csv')
+    with open('time_series.csv', 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(['Index', 'Time Series'])
+        for idx, series in enumerate(time_series_set):
+            writer.writerow([idx, series.tolist()])
 
-# Display the first few rows of the DataFrame
-print(df.head())
-df['Time Series'] = df['Time Series'].apply(lambda x: eval(x)).tolist()
+    df = pd.read_csv('time_series.csv')
 
+    # Display the first few rows of the DataFrame
+    print(df.head())
+    df['Time Series'] = df['Time Series'].apply(lambda x: eval(x)).tolist()
 
-# Initialize the distance matrix
-num_series = len(time_series_set)
-distance_matrix = np.zeros((num_series, num_series))
 
-# Measure the time taken to calculate the DTW distances
-start_time = time.time()
+    # Initialize the distance matrix
+    num_series = len(time_series_set)
+    distance_matrix = np.zeros((num_series, num_series))
 
-# Calculate DTW distance between each pair of time series with progress bar
-for i in tqdm(range(num_series), desc="Calculating DTW distances"):
-    for j in range(i+1, num_series):
-        distance = dtw_distance(time_series_set[i], time_series_set[j])
-        distance_matrix[i, j] = distance
-        distance_matrix[j, i] = distance  # Symmetric matrix
+    # Measure the time taken to calculate the DTW distances
+    start_time = time.time()
 
-end_time = time.time()
-time_taken = end_time - start_time
+    # Calculate DTW distance between each pair of time series with progress bar
+    for i in tqdm(range(num_series), desc="Calculating DTW distances"):
+        for j in range(i+1, num_series):
+            distance = dtw_distance(time_series_set[i], time_series_set[j])
+            distance_matrix[i, j] = distance
+            distance_matrix[j, i] = distance  # Symmetric matrix
 
-print("Distance Matrix:")
-print(distance_matrix)
-print(f"Time taken: {time_taken:.2f} seconds")
+    end_time = time.time()
+    time_taken = end_time - start_time
+
+    print("Distance Matrix:")
+    print(distance_matrix)
+    print(f"Time taken: {time_taken:.2f} seconds")
@@ -0,0 +1,144 @@
+import numpy as np
+from numba import jit, prange
+
+__all__ = ['dtw_distance_blas', 'dtw_pdist_blas']
+
+
+def dtw_distance_blas(embeddings1, offsets1, embeddings2, offsets2, block_size=256):
+    """
+    Computes the dataset cosine DTW distance matrix of two ragged datasets
+    (see ragged.py) of L2-normalized embeddings (ragged.normalize), with
+    the local costs computed by BLAS.
+
+    For a block of series of dataset 1 and a block of series of dataset 2,
+    the cosine similarities of all their timepoints are one matrix product
+    X1 @ X2.T, and the cost matrix of every pair of series is a sub-block
+    of it. Only the O(T1 * T2) min-recurrence is left to the Numba kernel,
+    instead of one 768-dim dot product per cell. Same result as
+    dtw_distance_ragged(..., normalized=True) up to the rounding.
+
+    Args:
+        embeddings1: normalized timepoints of dataset 1 of shape [sum T1, D]
+        offsets1: int64 array of shape [N1 + 1]
+        embeddings2: normalized timepoints of dataset 2 of shape [sum T2, D]
+        offsets2: int64 array of shape [N2 + 1]
+        block_size: number of series of every dataset per matrix product,
+            the product has about (block_size * mean T)^2 values
+
+    Returns:
+        Distance matrix of shape [N1, N2]
+    """
+    n1 = len(offsets1) - 1
+    n2 = len(offsets2) - 1
+
+    dist = np.empty((n1, n2), dtype=np.float64)
+
+    for r0 in range(0, n1, block_size):
+        r1 = min(r0 + block_size, n1)
+        block1 = np.asarray(embeddings1[offsets1[r0]:offsets1[r1]])
+        block_offsets1 = offsets1[r0:r1 + 1] - offsets1[r0]
+
+        for c0 in range(0, n2, block_size):
+            c1 = min(c0 + block_size, n2)
+            block2 = np.asarray(embeddings2[offsets2[c0]:offsets2[c1]])
+            block_offsets2 = offsets2[c0:c1 + 1] - offsets2[c0]
+
+            similarity = block1 @ block2.T
+            _dtw_similarity_block(similarity, block_offsets1, block_offsets2, dist[r0:r1, c0:c1])
+    return dist
+
+
+def dtw_pdist_blas(embeddings, offsets, block_size=256):
+    """
+    Computes the cosine DTW distances between all the pairs i < j of one
+    ragged dataset of L2-normalized embeddings, in the condensed order of
+    scipy.spatial.distance.pdist (see dtw_numba.dtw_pdist_ragged).
+
+    Only the blocks on and above the diagonal are multiplied, and in the
+    diagonal blocks only the pairs i < j go through the recurrence.
+
+    Args:
+        embeddings: normalized timepoints of shape [sum T, D]
+        offsets: int64 array of shape [N + 1]
+        block_size: number of series per matrix product
+
+    Returns:
+        Condensed distance array of shape [N * (N - 1) / 2]
+    """
+    n = len(offsets) - 1
+    dist = np.empty(n * (n - 1) // 2, dtype=np.float64)
+
+    for r0 in range(0, n, block_size):
+        r1 = min(r0 + block_size, n)
+        block1 = np.asarray(embeddings[offsets[r0]:offsets[r1]])
+        block_offsets1 = offsets[r0:r1 + 1] - offsets[r0]
+
+        for c0 in range(r0, n, block_size):
+            c1 = min(c0 + block_size, n)
+            block2 = np.asarray(embeddings[offsets[c0]:offsets[c1]])
+            block_offsets2 = offsets[c0:c1 + 1] - offsets[c0]
+
+            similarity = block1 @ block2.T
+            _dtw_similarity_block_condensed(similarity, block_offsets1, block_offsets2, r0, c0, n, dist)
+    return dist
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _dtw_similarity_block_condensed(similarity, offsets1, offsets2, r0, c0, n, out):
+    """
+    Same as _dtw_similarity_block for the pairs i < j of a block of one
+    dataset starting at series (r0, c0), written to the condensed array.
+    """
+    n1 = offsets1.shape[0] - 1
+    n2 = offsets2.shape[0] - 1
+    max_length = similarity.shape[1]
+
+    for bi in prange(n1):
+        row = np.empty(max_length)
+        i = r0 + bi
+        # The pair (i, j) is at row_start + j in the condensed array
+        row_start = n * i - i * (i + 1) // 2 - i - 1
+        for bj in range(max(0, i + 1 - c0), n2):
+            j = c0 + bj
+            out[row_start + j] = _dtw_similarity(similarity[offsets1[bi]:offsets1[bi + 1], offsets2[bj]:offsets2[bj + 1]], row)
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _dtw_similarity_block(similarity, offsets1, offsets2, out):
+    """
+    Fills out[i, j] with the DTW distance of series i and j of a block,
+    given the cosine similarities of all the timepoints of the block.
+    """
+    n1 = offsets1.shape[0] - 1
+    n2 = offsets2.shape[0] - 1
+    max_length = similarity.shape[1]
+
+    for i in prange(n1):
+        # One row buffer per row of pairs, reused by all of them
+        row = np.empty(max_length)
+        for j in range(n2):
+            out[i, j] = _dtw_similarity(similarity[offsets1[i]:offsets1[i + 1], offsets2[j]:offsets2[j + 1]], row)
+
+
+@jit(nopython=True, cache=True)
+def _dtw_similarity(similarity, row):
+    """
+    Returns the DTW distance of two series from the matrix of the cosine
+    similarities of their timepoints, of shape [T1, T2], keeping one row
+    of the cost matrix in row (at least T2 values, see dtw_numba._dtw_row).
+    """
+    l1, l2 = similarity.shape
+
+    row[0] = 1.0 - similarity[0, 0]
+    for j in range(1, l2):
+        row[j] = row[j - 1] + (1.0 - similarity[0, j])
+
+    for i in range(1, l1):
+        diagonal = row[0]
+        row[0] = diagonal + (1.0 - similarity[i, 0])
+        for j in range(1, l2):
+            up = row[j]
+            row[j] = (1.0 - similarity[i, j]) + min(up, row[j - 1], diagonal)
+            diagonal = up
+
+    return row[l2 - 1]
@@ -1,33 +1,273 @@
 import numpy as np
-from numba import jit, prange
-from sklearn.metrics import accuracy_score
+from numba import jit, prange, get_num_threads, literally
+from ragged import to_ragged
 
-__all__ = ['dtw_distance', 'KnnDTW']
+__all__ = ['dtw_distance', 'dtw_distance_ragged', 'dtw_pdist_ragged', 'squareform', 'KnnDTW']
 
+# Global constraints of the warping path
+_NO_BAND = 0
+_SAKOE_CHIBA = 1
+_ITAKURA = 2
 
-@jit(nopython=True, parallel=True, nogil=True)
-def dtw_distance(dataset1, dataset2):
+_BANDS = {None: _NO_BAND, 'sakoe_chiba': _SAKOE_CHIBA, 'itakura': _ITAKURA}
+
+# Cost of two timepoints, the kernels take its code and not the jitted function: Numba can
+# cache a kernel on disk for an int argument, never for a function argument
+_COSINE = 0
+_COSINE_NORMALIZED = 1
+_EUCLIDEAN = 2
+_SQEUCLIDEAN = 3
+_INNER = 4
+
+_METRICS = {'cosine': _COSINE, 'euclidean': _EUCLIDEAN, 'sqeuclidean': _SQEUCLIDEAN, 'inner': _INNER}
+
+
+def dtw_distance(dataset1, dataset2, band=None, window=None, slope=2.0, metric='cosine'):
     """
     Computes the dataset DTW distance matrix using multiprocessing.
 
+    The cost of two timepoints a and b is given by metric:
+    - 'cosine': 1 - a.b / (|a| |b|)
+    - 'euclidean': |a - b|
+    - 'sqeuclidean': |a - b|^2
+    - 'inner': -a.b, which can be negative, so that the DTW favours
+      the longer warping paths
+    The kernels are compiled for each metric (see _metric_code), the
+    cells do not test the metric.
+
+    The warping path can be constrained to a band around the diagonal,
+    only the cells of the band are computed, with O(band width) memory:
+    - 'sakoe_chiba': at most window cells from the diagonal (scaled to
+      the lengths of the two series), an int is a number of cells and a
+      float a fraction of the length of the longer series
+    - 'itakura': parallelogram of the paths with a local slope between
+      1 / slope and slope
+    The band is widened where needed so that it always contains a path,
+    window=0 is the diagonal alignment.
+
     Args:
         dataset1: timeseries dataset of shape [N1, T1, D]
         dataset2: timeseries dataset of shape [N2, T2, D]
+        band: None (unconstrained), 'sakoe_chiba' or 'itakura',
+            'sakoe_chiba' if only window is given
+        window: width of the Sakoe-Chiba band
+        slope: maximal slope of the Itakura parallelogram, > 1
+        metric: 'cosine', 'euclidean', 'sqeuclidean' or 'inner'
 
     Returns:
         Distance matrix of shape [N1, N2]
     """
+    return _dtw_dataset(dataset1, dataset2, _metric_code(metric), *_band_args(band, window, slope))
+
+
+def _metric_code(metric, normalized=False):
+    """
+    Checks the metric and returns its code, the single dot product of the
+    cosine for normalized timepoints. The code is a literal argument of
+    the kernels (numba.literally): each metric gets its own compiled and
+    cached kernel, in which _cost is reduced to the cost of the metric.
+    """
+    if metric not in _METRICS:
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {list(_METRICS)}")
+    if metric == 'cosine' and normalized:
+        return _COSINE_NORMALIZED
+    return _METRICS[metric]
+
+
+def _band_args(band, window, slope):
+    """
+    Checks the band parameters and returns them as the band code, the
+    absolute and relative Sakoe-Chiba windows and the Itakura slope.
+    """
+    if band is None and window is not None:
+        band = 'sakoe_chiba'
+    if band not in _BANDS:
+        raise ValueError(f"Unknown band {band!r}, expected one of {list(_BANDS)}")
+
+    abs_window, rel_window = 0, 0.0
+    if band == 'sakoe_chiba':
+        if window is None or window < 0:
+            raise ValueError("The Sakoe-Chiba band needs a window >= 0")
+        if isinstance(window, (int, np.integer)):
+            abs_window = int(window)
+        else:
+            rel_window = float(window)
+    if band == 'itakura' and slope <= 1:
+        raise ValueError("The Itakura slope must be > 1")
+    return _BANDS[band], abs_window, rel_window, float(slope)
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _dtw_dataset(dataset1, dataset2, metric, band, window, rel_window, slope):
+    """
+    Computes the DTW distance matrix of two datasets of shape [N, T, D]
+    with the given metric code and band.
+    """
+    literally(metric)
     n1 = len(dataset1)
     n2 = len(dataset2)
 
+    max_length = 0
+    for i in range(n1):
+        max_length = max(max_length, len(dataset1[i]))
+    for j in range(n2):
+        max_length = max(max_length, len(dataset2[j]))
+
+    dist = np.empty((n1, n2), dtype=np.float64)
+
+    for i in prange(n1):
+        # Scratch buffers of the thread, reused for the whole row of pairs
+        work, bounds = _scratch(max_length)
+        for j in range(n2):
+            dist[i][j] = _dtw_pair(dataset1[i], dataset2[j], metric, band, window, rel_window, slope, work, bounds)
+    return dist
+
+
+def dtw_distance_ragged(embeddings1, offsets1, embeddings2, offsets2, normalized=False,
+                        band=None, window=None, slope=2.0, metric='cosine'):
+    """
+    Computes the dataset DTW distance matrix for datasets in the ragged
+    layout (see ragged.py). The series are views of the embeddings arrays,
+    so nothing is copied, and the arrays can be memory maps.
+
+    With normalized=True the embeddings must be L2-normalized beforehand
+    (ragged.normalize), and the cosine distance of two timepoints is a
+    single dot product instead of a dot product and two norms. The
+    distances differ from the default ones only by the 1e-8 term of
+    _cosine and the rounding: about 1e-8 per aligned pair of timepoints
+    in float64 and below 1e-6 in float32, so the difference for a pair
+    of series stays below (T1 + T2) * 1e-6. The other metrics do not
+    depend on normalized.
+
+    Args:
+        embeddings1: timepoints of all the series of dataset 1 of shape [sum T1, D]
+        offsets1: int64 array of shape [N1 + 1], series i of dataset 1 is
+            embeddings1[offsets1[i]:offsets1[i + 1]]
+        embeddings2: timepoints of all the series of dataset 2 of shape [sum T2, D]
+        offsets2: int64 array of shape [N2 + 1]
+        normalized: the timepoints have unit norm
+        band, window, slope: constraint of the warping path (see dtw_distance)
+        metric: cost of two timepoints (see dtw_distance)
+
+    Returns:
+        Distance matrix of shape [N1, N2]
+    """
+    metric = _metric_code(metric, normalized)
+    return _dtw_ragged(embeddings1, offsets1, embeddings2, offsets2, metric, *_band_args(band, window, slope))
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _dtw_ragged(embeddings1, offsets1, embeddings2, offsets2, metric, band, window, rel_window, slope):
+    """
+    Computes the DTW distance matrix of two ragged datasets with the
+    given metric code and band.
+    """
+    literally(metric)
+    n1 = offsets1.shape[0] - 1
+    n2 = offsets2.shape[0] - 1
+    max_length = max(_max_length(offsets1), _max_length(offsets2))
+
     dist = np.empty((n1, n2), dtype=np.float64)
 
     for i in prange(n1):
-        for j in prange(n2):
-            dist[i][j] = _dtw_distance(dataset1[i], dataset2[j])
+        # Scratch buffers of the thread, reused for the whole row of pairs
+        work, bounds = _scratch(max_length)
+        series1 = embeddings1[offsets1[i]:offsets1[i + 1]]
+        for j in range(n2):
+            dist[i][j] = _dtw_pair(series1, embeddings2[offsets2[j]:offsets2[j + 1]], metric,
+                                   band, window, rel_window, slope, work, bounds)
+    return dist
+
+
+def dtw_pdist_ragged(embeddings, offsets, normalized=False, n_chunks=None, band=None, window=None, slope=2.0,
+                     metric='cosine'):
+    """
+    Computes the DTW distances between all the pairs of series of one
+    ragged dataset. The DTW is symmetric and zero on the diagonal (except
+    for the 'inner' metric, squareform still puts zeros there), so only
+    the pairs i < j are computed, half of the full matrix.
+
+    The result is condensed as scipy.spatial.distance.pdist: the distance
+    of the pair i < j is at index N * i - i * (i + 1) / 2 + j - i - 1.
+    The work is split into n_chunks consecutive ranges of this index with
+    the same number of pairs, so the threads get balanced shares of the
+    triangle instead of rows of decreasing length.
+
+    Args:
+        embeddings: timepoints of all the series of shape [sum T, D]
+        offsets: int64 array of shape [N + 1]
+        normalized: the timepoints have unit norm (see dtw_distance_ragged)
+        n_chunks: number of ranges of pairs, the number of threads by default
+        band, window, slope: constraint of the warping path (see dtw_distance)
+        metric: cost of two timepoints (see dtw_distance)
+
+    Returns:
+        Condensed distance array of shape [N * (N - 1) / 2],
+        squareform gives the full square matrix
+    """
+    if n_chunks is None:
+        n_chunks = get_num_threads()
+    metric = _metric_code(metric, normalized)
+    return _dtw_pdist(embeddings, offsets, metric, n_chunks, *_band_args(band, window, slope))
+
+
+def squareform(condensed):
+    """
+    Returns the full square distance matrix of a condensed distance array
+    (zeros on the diagonal).
+    """
+    from scipy.spatial.distance import squareform as scipy_squareform
+    return scipy_squareform(condensed, checks=False)
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _dtw_pdist(embeddings, offsets, metric, n_chunks, band, window, rel_window, slope):
+    """
+    Computes the condensed DTW distances of all the pairs i < j of a
+    ragged dataset, every chunk computes a range of consecutive pairs.
+    """
+    literally(metric)
+    n = offsets.shape[0] - 1
+    n_pairs = n * (n - 1) // 2
+    max_length = _max_length(offsets)
+
+    dist = np.empty(n_pairs, dtype=np.float64)
+
+    for chunk in prange(n_chunks):
+        start = chunk * n_pairs // n_chunks
+        stop = (chunk + 1) * n_pairs // n_chunks
+        if start < stop:
+            work, bounds = _scratch(max_length)
+            i, j = _condensed_to_pair(start, n)
+            series1 = embeddings[offsets[i]:offsets[i + 1]]
+            for k in range(start, stop):
+                dist[k] = _dtw_pair(series1, embeddings[offsets[j]:offsets[j + 1]], metric,
+                                    band, window, rel_window, slope, work, bounds)
+                j += 1
+                if j == n:
+                    i += 1
+                    j = i + 1
+                    series1 = embeddings[offsets[i]:offsets[i + 1]]
     return dist
 
 
+@jit(nopython=True, cache=True)
+def _condensed_to_pair(k, n):
+    """
+    Returns the pair (i, j), i < j, at index k of a condensed distance
+    array of n series.
+    """
+    # Row i starts at index i * (2n - i - 1) / 2, estimate i and correct the rounding
+    i = int(n - 2 - np.floor(np.sqrt(-8.0 * k + 4.0 * n * (n - 1) - 7) / 2.0 - 0.5))
+    i = min(max(i, 0), n - 2)
+    while i > 0 and i * (2 * n - i - 1) // 2 > k:
+        i -= 1
+    while i < n - 2 and (i + 1) * (2 * n - i - 2) // 2 <= k:
+        i += 1
+    j = k - i * (2 * n - i - 1) // 2 + i + 1
+    return i, j
+
+
 @jit(nopython=True, cache=True)
 def _dtw_distance(series1, series2):
     """
@@ -43,26 +283,169 @@ def _dtw_distance(series1, series2):
     Returns:
         DTW distance between A and B
     """
-    l1, l2 = series1.shape[0], series2.shape[0]
-    E = np.empty((l1, l2))
+    return _dtw(series1, series2, _COSINE)
 
-    # Fill First Cell
-    E[0][0] = _cosine(series1[0], series2[0])
 
-    # Fill First Column
-    for i in range(1, l1):
-        E[i][0] = E[i - 1][0] + _cosine(series1[i], series2[0])
+@jit(nopython=True, cache=True)
+def _dtw(series1, series2, metric):
+    """
+    Returns the DTW distance between two 2-D timeseries numpy arrays
+    with _cost(metric, a, b) as the distance between two timepoints.
+    """
+    return _dtw_row(series1, series2, metric, np.empty(series2.shape[0]))
+
+
+@jit(nopython=True, cache=True)
+def _dtw_row(series1, series2, metric, row):
+    """
+    Same as _dtw with a caller-owned buffer of at least T2 values.
+
+    The cost matrix is never stored: row holds the previous row of it and
+    is overwritten in place, with the cell up-left of the current one kept
+    in a scalar. The values and the order of the operations are the same
+    as with the full matrix, so is the result.
+    """
+    l1, l2 = series1.shape[0], series2.shape[0]
 
     # Fill First Row
-    for i in range(1, l2):
-        E[0][i] = E[0][i - 1] + _cosine(series1[0], series2[i])
+    row[0] = _cost(metric, series1[0], series2[0])
+    for j in range(1, l2):
+        row[j] = row[j - 1] + _cost(metric, series1[0], series2[j])
 
     for i in range(1, l1):
+        diagonal = row[0]
+        # Fill First Column
+        row[0] = diagonal + _cost(metric, series1[i], series2[0])
         for j in range(1, l2):
-            cost = _cosine(series1[i], series2[j])
-            E[i][j] = cost + min(E[i - 1][j], E[i][j - 1], E[i - 1][j - 1])
+            up = row[j]
+            row[j] = _cost(metric, series1[i], series2[j]) + min(up, row[j - 1], diagonal)
+            diagonal = up
+
+    return row[l2 - 1]
+
+
+@jit(nopython=True, cache=True)
+def _scratch(max_length):
+    """
+    Returns the scratch buffers of _dtw_pair for series of at most
+    max_length timepoints: two rows of costs and two rows of band bounds.
+    """
+    return np.empty((2, max(max_length, 1))), np.empty((2, max(max_length, 1)), dtype=np.int64)
+
+
+@jit(nopython=True, cache=True)
+def _max_length(offsets):
+    """Returns the length of the longest series of a ragged dataset."""
+    max_length = 0
+    for i in range(offsets.shape[0] - 1):
+        max_length = max(max_length, offsets[i + 1] - offsets[i])
+    return max_length
+
+
+@jit(nopython=True, cache=True)
+def _dtw_pair(series1, series2, metric, band, window, rel_window, slope, work, bounds):
+    """
+    Returns the DTW distance between two series, constrained to the band
+    if there is one, with the scratch buffers of _scratch.
+    """
+    if band == _NO_BAND:
+        return _dtw_row(series1, series2, metric, work[0])
+    return _dtw_band(series1, series2, metric, band, window, rel_window, slope, work, bounds)
+
+
+@jit(nopython=True, cache=True)
+def _band_bounds(l1, l2, band, window, rel_window, slope, lo, hi):
+    """
+    Fills lo and hi with the first and last columns of the band in every
+    row of the [l1, l2] cost matrix, widened so that the band contains a
+    path from (0, 0) to (l1 - 1, l2 - 1).
+    """
+    if band == _SAKOE_CHIBA:
+        w = max(window, int(np.ceil(rel_window * max(l1, l2))))
+    for i in range(l1):
+        # Position of the row on the diagonal, from 0 to 1
+        x = i / (l1 - 1) if l1 > 1 else 0.0
+        if band == _SAKOE_CHIBA:
+            center = int(np.round(x * (l2 - 1)))
+            lo[i] = center - w
+            hi[i] = center + w
+        else:
+            lo[i] = int(np.ceil(max(x / slope, 1.0 - slope * (1.0 - x)) * (l2 - 1) - 1e-9))
+            hi[i] = int(np.floor(min(slope * x, 1.0 - (1.0 - x) / slope) * (l2 - 1) + 1e-9))
+        lo[i] = min(max(lo[i], 0), l2 - 1)
+        hi[i] = min(max(hi[i], 0), l2 - 1)
+
+    lo[0] = 0
+    hi[l1 - 1] = l2 - 1
+    for i in range(1, l1):
+        # Every row must have a cell reachable from the previous row
+        if lo[i] > hi[i - 1] + 1:
+            lo[i] = hi[i - 1] + 1
+        if hi[i] < lo[i - 1]:
+            hi[i] = lo[i - 1]
+        if hi[i] < lo[i]:
+            hi[i] = lo[i]
 
-    return E[-1][-1]
+
+@jit(nopython=True, cache=True)
+def _dtw_band(series1, series2, metric, band, window, rel_window, slope, work, bounds):
+    """
+    Returns the DTW distance between two 2-D timeseries numpy arrays,
+    computing only the cells of the band. The band is always built with
+    the shorter series along the rows, so that the distance stays
+    symmetric.
+    """
+    if series1.shape[0] <= series2.shape[0]:
+        return _dtw_band_rows(series1, series2, metric, band, window, rel_window, slope, work, bounds)
+    return _dtw_band_rows(series2, series1, metric, band, window, rel_window, slope, work, bounds)
+
+
+@jit(nopython=True, cache=True)
+def _dtw_band_rows(series1, series2, metric, band, window, rel_window, slope, work, bounds):
+    """
+    Band DTW with series1 along the rows. Only two rows of the band are
+    kept (in work), the cells out of the band are infinite.
+    """
+    l1, l2 = series1.shape[0], series2.shape[0]
+    lo, hi = bounds[0], bounds[1]
+    _band_bounds(l1, l2, band, window, rel_window, slope, lo, hi)
+    prev, curr = work[0], work[1]
+
+    # First row, lo[0] is 0
+    prev[0] = _cost(metric, series1[0], series2[0])
+    for j in range(1, hi[0] + 1):
+        prev[j] = prev[j - 1] + _cost(metric, series1[0], series2[j])
+
+    for i in range(1, l1):
+        lo_prev, hi_prev = lo[i - 1], hi[i - 1]
+        for j in range(lo[i], hi[i] + 1):
+            best = np.inf
+            if lo_prev <= j <= hi_prev:
+                best = prev[j - lo_prev]
+            if lo_prev <= j - 1 <= hi_prev:
+                best = min(best, prev[j - 1 - lo_prev])
+            if j > lo[i]:
+                best = min(best, curr[j - 1 - lo[i]])
+            curr[j - lo[i]] = _cost(metric, series1[i], series2[j]) + best
+        prev, curr = curr, prev
+
+    return prev[l2 - 1 - lo[l1 - 1]]
+
+@jit(nopython=True, cache=True)
+def _cost(metric, a, b):
+    """
+    Returns the cost of two timepoints for a metric code. For a literal
+    code the branches of the other metrics are pruned at compile time.
+    """
+    if metric == _COSINE_NORMALIZED:
+        return _cosine_normalized(a, b)
+    if metric == _EUCLIDEAN:
+        return np.sqrt(_sqeuclidean(a, b))
+    if metric == _SQEUCLIDEAN:
+        return _sqeuclidean(a, b)
+    if metric == _INNER:
+        return -np.dot(a, b)
+    return _cosine(a, b)
 
 @jit(nopython=True, cache=True)
 def _cosine(a, b):
@@ -80,6 +463,37 @@ def _cosine(a, b):
     norm_b = np.linalg.norm(b)
     return 1.0 - (dot_product / (norm_a * norm_b + 1e-8))  # Adding a small value to avoid division by zero
 
+@jit(nopython=True, cache=True)
+def _cosine_normalized(a, b):
+    """
+    Compute cosine distance between two vectors of unit norm.
+
+    Args:
+        a, b: 1-D arrays containing elements of L2-normalized vectors.
+
+    Returns:
+        Cosine distance between vectors a and b.
+    """
+    return 1.0 - np.dot(a, b)
+
+@jit(nopython=True, cache=True)
+def _sqeuclidean(a, b):
+    """
+    Compute squared euclidean distance between two vectors, without
+    the temporary array of a - b.
+
+    Args:
+        a, b: 1-D arrays containing elements of vectors.
+
+    Returns:
+        Squared euclidean distance between vectors a and b.
+    """
+    total = 0.0
+    for k in range(a.shape[0]):
+        d = a[k] - b[k]
+        total += d * d
+    return total
+
 # Modified from https://github.com/markdregan/K-Nearest-Neighbors-with-Dynamic-Time-Warping
 class KnnDTW(object):
     """K-nearest neighbor classifier using dynamic time warping
@@ -89,10 +503,24 @@ class KnnDTW(object):
     ---------
     n_neighbors : int, optional (default = 1)
         Number of neighbors to use by default for KNN
+
+    prune : bool, optional (default = False)
+        Find the neighbors with lower bounds and early abandoning
+        (lower_bounds.dtw_kneighbors) instead of the full distance matrix,
+        the bounds are only valid for the cosine metric, the other metrics
+        always compute the full distance matrix. The neighbors at the same
+        distance can come in another order than with the full matrix
+
+    metric : str, optional (default = 'cosine')
+        Cost of two timepoints: 'cosine', 'euclidean', 'sqeuclidean' or
+        'inner' (see dtw_distance)
     """
 
-    def __init__(self, n_neighbors=1):
+    def __init__(self, n_neighbors=1, prune=False, metric='cosine'):
+        _metric_code(metric)
         self.n_neighbors = n_neighbors
+        self.prune = prune
+        self.metric = metric
 
     def fit(self, x, y):
         """Fit the model using x as training data and y as class labels
@@ -108,6 +536,53 @@ class KnnDTW(object):
 
         self.x = np.copy(x)
         self.y = np.copy(y)
+        self._index = None
+
+    def _search_index(self):
+        """Builds once the ragged training data and its lower bounds index"""
+        if self._index is None:
+            from lower_bounds import build_search_index
+            embeddings, offsets = to_ragged(self.x, dtype=np.float64)
+            self._index = (embeddings, offsets, build_search_index(embeddings, offsets))
+        return self._index
+
+    def kneighbors(self, x, n_neighbors=None, candidates=None):
+        """Finds the nearest training samples of every testing sample
+        without computing the full distance matrix (cosine metric)
+
+        Arguments
+        ---------
+        x : array of shape [n_samples, n_timepoints]
+            Array containing the testing data set
+
+        n_neighbors : int, optional (default = None)
+            Number of neighbors, self.n_neighbors if None
+
+        candidates : array of int, optional (default = None)
+            Indices of the training samples searched, all if None
+
+        Returns
+        -------
+        2 arrays of shape [n_samples, n_neighbors] representing:
+            (1) the DTW distances to the neighbors, increasing
+            (2) the indices of the neighbors in the training data
+        """
+        from lower_bounds import dtw_kneighbors
+
+        if n_neighbors is None:
+            n_neighbors = self.n_neighbors
+        if self.metric != 'cosine':
+            # The lower bounds are those of the cosine, the other metrics compute all the distances
+            if candidates is None:
+                candidates = np.arange(len(self.x))
+            dm = self._dist_matrix(x, self.x[candidates])
+            knn_idx = dm.argsort(kind='stable')[:, :n_neighbors]
+            return np.take_along_axis(dm, knn_idx, axis=1), np.asarray(candidates)[knn_idx]
+        train_embeddings, train_offsets, index = self._search_index()
+        embeddings, offsets = to_ragged(x, dtype=np.float64)
+        distances, indices, _ = dtw_kneighbors(embeddings, offsets, train_embeddings, train_offsets,
+                                               n_neighbors, index=index, candidates=candidates)
+        return distances, indices
 
     def _dist_matrix(self, x, y):
         """Computes the M x N distance matrix between the training
@@ -124,7 +599,7 @@ class KnnDTW(object):
         Distance matrix between each item of x and y with
             shape [training_n_samples, testing_n_samples]
         """
-        dm = dtw_distance(x, y)
+        dm = dtw_distance(x, y, metric=self.metric)
 
         return dm
 
@@ -144,15 +619,19 @@ class KnnDTW(object):
               (2) the knn label count probability
         """
         np.random.seed(0)
-        dm = self._dist_matrix(x, self.x)
+        if self.prune:
+            _, knn_idx = self.kneighbors(x)
+        else:
+            dm = self._dist_matrix(x, self.x)
 
-        # Identify the k nearest neighbors
-        knn_idx = dm.argsort()[:, :self.n_neighbors]
+            # Identify the k nearest neighbors
+            knn_idx = dm.argsort()[:, :self.n_neighbors]
 
         # Identify k nearest labels
         knn_labels = self.y[knn_idx]
 
         # Model Label
+        from scipy.stats import mode
         mode_data = mode(knn_labels, axis=1)
         mode_label = mode_data[0]
         mode_proba = mode_data[1] / self.n_neighbors
@@ -183,7 +662,8 @@ class KnnDTW(object):
         y = y.astype('int32')
         pred_labels = pred_labels.astype('int32')
 
-        # Compute accuracy measure
+        # Compute accuracy measure, sklearn is only imported by the classifier
+        from sklearn.metrics import accuracy_score
         accuracy = accuracy_score(y, pred_labels)
         return accuracy
 
@@ -203,21 +683,26 @@ class KnnDTW(object):
                 (2) the knn labels
         """
         np.random.seed(0)
-        dm = self._dist_matrix(x, self.x)
-
-        # Invert the distance matrix
-        dm = -dm
-
         classes = np.unique(self.y)
         class_dm = []
 
+        if not self.prune:
+            dm = self._dist_matrix(x, self.x)
+
+            # Invert the distance matrix
+            dm = -dm
+
         # Partition distance matrix by class
         for i, cls in enumerate(classes):
             idx = np.argwhere(self.y == cls)[:, 0]
-            cls_dm = dm[:, idx]  # [N_test, N_train_c]
-
-            # Take maximum distance vector due to softmax probabilities
-            cls_dm = np.max(cls_dm, axis=-1)  # [N_test,]
+            if self.prune:
+                # Only the nearest sample of the class is needed
+                cls_dm = -self.kneighbors(x, 1, candidates=idx)[0][:, 0]  # [N_test,]
+            else:
+                cls_dm = dm[:, idx]  # [N_test, N_train_c]
+
+                # Take maximum distance vector due to softmax probabilities
+                cls_dm = np.max(cls_dm, axis=-1)  # [N_test,]
 
             class_dm.append([cls_dm])
 
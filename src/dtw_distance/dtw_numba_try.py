@@ -1,5 +1,7 @@
 import numpy as np
-from dtw_numba import dtw_distance, _cosine
+from dtw_numba import dtw_distance, dtw_distance_ragged, _cosine
+from ragged import get_series
+from schedule import dtw_distance_scheduled, print_report
 import time
 from tqdm import tqdm
 
@@ -26,17 +28,27 @@ def dtw_distance_mine(series1, series2):
     # The DTW distance is the value at the bottom-right corner of the matrix
     return dtw_matrix[n, m]
 
-time_series_set = [np.random.rand(np.random.randint(5, 15), 768) for _ in range(30000)]
+if __name__ == "__main__":
 
-start_time = time.time()
-res_numba = dtw_distance(time_series_set[:100], time_series_set)
-end_time = time.time()
-time_taken = end_time - start_time
-print(f"Time taken: {time_taken:.2f} seconds")
+    # 30000 chains of 5-15 emails in the ragged layout: one float32 array and the offsets
+    lengths = np.random.randint(5, 15, 30000)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    embeddings = np.random.default_rng().random((offsets[-1], 768), dtype=np.float32)
+
+    start_time = time.time()
+    res_numba = dtw_distance_ragged(embeddings, offsets[:101], embeddings, offsets)
+    end_time = time.time()
+    time_taken = end_time - start_time
+    print(f"Time taken: {time_taken:.2f} seconds")
+
+    # Same rows with the cost-balanced dynamic schedule, and how busy the threads were
+    res_scheduled, report = dtw_distance_scheduled(embeddings, offsets[:101], embeddings, offsets, report=True)
+    print_report(report)
 
 """
 # Initialize the distance matrix
-num_series = len(time_series_set)
+num_series = len(offsets) - 1
 distance_matrix = np.zeros((num_series, num_series))
 
 # Measure the time taken to calculate the DTW distances
@@ -45,7 +57,7 @@ start_time = time.time()
 # Calculate DTW distance between each pair of time series with progress bar
 for i in tqdm(range(num_series), desc="Calculating DTW distances"):
     for j in range(i+1, num_series):
-        distance = dtw_distance_mine(time_series_set[i], time_series_set[j])
+        distance = dtw_distance_mine(get_series(embeddings, offsets, i), get_series(embeddings, offsets, j))
         distance_matrix[i, j] = distance
         distance_matrix[j, i] = distance  # Symmetric matrix
 
@@ -56,7 +68,7 @@ print("Distance Matrix:")
 print(distance_matrix)
 print(f"Time taken: {time_taken:.2f} seconds")
 
-dtw_distance(time_series_set, time_series_set)
+dtw_distance_ragged(embeddings, offsets, embeddings, offsets)
 
 all_elements_close = np.all(np.isclose(res_numba, distance_matrix))
 print(all_elements_close)  
@@ -0,0 +1,184 @@
+import os
+import time
+import numpy as np
+from multiprocessing import get_context, shared_memory
+from numba import set_num_threads
+from tiled import tile_grid, compute_tile
+
+__all__ = ['SharedArray', 'dtw_distance_pool']
+
+# Number of series per side of a task, small enough to balance the workers
+POOL_TILE_SIZE = 256
+
+# Arrays of the running pool, attached once per worker process
+_worker_arrays = {}
+
+
+class SharedArray(object):
+    """NumPy array in a multiprocessing.shared_memory block
+
+    Arguments
+    ---------
+    shape : tuple of int
+        Shape of the array
+
+    dtype : numpy dtype
+        Type of the values of the array
+
+    name : str, optional (default = None)
+        Name of an existing block to attach to, a new block is created if None
+    """
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        size = max(1, int(np.prod(self.shape)) * self.dtype.itemsize)
+        if name is None:
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @classmethod
+    def copy_of(cls, array):
+        """Creates a shared array with a copy of array (can be a memory map)"""
+        shared = cls(array.shape, array.dtype)
+        shared.array[:] = array
+        return shared
+
+    def spec(self):
+        """Returns what a worker needs to attach to the array"""
+        return self.shm.name, self.shape, self.dtype.str
+
+    def close(self, unlink=False):
+        """Detaches from the block, and frees it with unlink=True"""
+        del self.array
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+def _init_worker(specs, out_path, offsets1, offsets2, normalized, numba_threads):
+    # One Numba thread per process by default, the processes are the parallelism
+    set_num_threads(numba_threads)
+    for key, (name, shape, dtype) in specs.items():
+        _worker_arrays[key] = SharedArray(shape, dtype, name=name)
+    if out_path is not None:
+        _worker_arrays['out_matrix'] = np.load(out_path, mmap_mode='r+')
+    else:
+        _worker_arrays['out_matrix'] = _worker_arrays['out'].array
+    _worker_arrays['offsets1'] = offsets1
+    _worker_arrays['offsets2'] = offsets2
+    _worker_arrays['normalized'] = normalized
+
+
+def _run_tile(task):
+    tile, symmetric = task
+    start = time.perf_counter()
+    arrays = _worker_arrays
+    embeddings1 = arrays['embeddings1'].array
+    embeddings2 = arrays['embeddings2'].array if 'embeddings2' in arrays else embeddings1
+    out = arrays['out_matrix']
+
+    r0, r1, c0, c1 = tile
+    block = compute_tile(embeddings1, arrays['offsets1'], embeddings2, arrays['offsets2'], tile, arrays['normalized'])
+    out[r0:r1, c0:c1] = block
+    if symmetric and c0 != r0:
+        out[c0:c1, r0:r1] = block.T
+    if isinstance(out, np.memmap):
+        # The mapping of the worker is its own, the tile is on disk once reported as done
+        out.flush()
+    return tile, os.getpid(), time.perf_counter() - start
+
+
+def dtw_distance_pool(embeddings1, offsets1, embeddings2, offsets2, normalized=False, symmetric=False,
+                      n_workers=None, numba_threads=1, tile_size=POOL_TILE_SIZE, tiles=None, out=None,
+                      dtype=np.float64):
+    """
+    Computes the DTW distance matrix of two ragged datasets (see ragged.py)
+    with a pool of processes, so the work is not bound by the GIL nor by
+    the threads of one process.
+
+    The embeddings are copied once into shared memory, the workers attach
+    to them and to the output matrix, compute tiles (tiled.compute_tile)
+    and write them in place: only the tile bounds go through the pool
+    queue. The tiles are handed out one at a time, the most expensive first.
+    The output matrix is never copied: it is either a .npy file the
+    workers memory-map, or a shared memory block handed to the caller.
+
+    The tiles parameter selects a subset of tile_grid(N1, N2, tile_size,
+    symmetric), e.g. tiles[k::n_machines] for machine k of n_machines,
+    with the parts of the other machines left as they are (zero in a new
+    .npy file or shared block).
+
+    The workers are spawned and import the main module again, so the
+    calling script must run under if __name__ == "__main__". For that
+    reason the backend is standalone and not a mode of apply_dtw.py, whose
+    steps run at the top level of the script.
+
+    Args:
+        embeddings1, offsets1: ragged dataset 1, N1 series
+        embeddings2, offsets2: ragged dataset 2, N2 series, can be the
+            same objects as dataset 1, they are then shared once
+        normalized: the timepoints have unit norm (see compute_tile)
+        symmetric: the datasets are the same, only the tiles on and above
+            the diagonal are computed and mirrored
+        n_workers: number of processes, the number of CPUs by default
+        numba_threads: number of Numba threads of every process
+        tile_size: number of series per side of a tile
+        tiles: tiles to compute, all the tiles by default
+        out: path of a .npy file of shape [N1, N2] and type dtype the
+            workers write to (e.g. created by np.lib.format.open_memmap),
+            or a SharedArray of that shape and type, a new SharedArray by
+            default
+        dtype: type of the output matrix, e.g. np.float32 as the matrix of
+            apply_dtw.py (the tiles are computed in float64)
+
+    Returns:
+        The distance matrix of shape [N1, N2], as a memory map of out if
+        it is a path, else as the SharedArray (its .array), which the
+        caller frees with close(unlink=True), and the busy time of every
+        worker process in seconds
+    """
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    offsets1 = np.asarray(offsets1, dtype=np.int64)
+    offsets2 = np.asarray(offsets2, dtype=np.int64)
+    n1, n2 = len(offsets1) - 1, len(offsets2) - 1
+
+    if tiles is None:
+        tiles = tile_grid(n1, n2, tile_size, symmetric)
+    lengths1, lengths2 = np.diff(offsets1), np.diff(offsets2)
+    tiles = sorted(tiles, key=lambda t: -int(lengths1[t[0]:t[1]].sum()) * int(lengths2[t[2]:t[3]].sum()))
+
+    out_path = out if isinstance(out, (str, os.PathLike)) else None
+    if out_path is not None:
+        out = np.load(out_path, mmap_mode='r+')
+    elif out is None:
+        # A new shared memory block is zero-filled
+        out = SharedArray((n1, n2), dtype)
+    if out.shape != (n1, n2) or out.dtype != np.dtype(dtype):
+        raise ValueError(f"The output must be {np.dtype(dtype)} of shape {(n1, n2)}, "
+                         f"not {out.dtype} of shape {out.shape}")
+
+    shared = {'embeddings1': SharedArray.copy_of(embeddings1)}
+    try:
+        if embeddings2 is not embeddings1:
+            shared['embeddings2'] = SharedArray.copy_of(embeddings2)
+        specs = {key: array.spec() for key, array in shared.items()}
+        if out_path is None:
+            specs['out'] = out.spec()
+
+        busy = {}
+        # Forking a process that already ran parallel Numba code is not safe, the workers are spawned
+        with get_context('spawn').Pool(n_workers, initializer=_init_worker,
+                                       initargs=(specs, out_path, offsets1, offsets2, normalized,
+                                                 numba_threads)) as pool:
+            for tile, pid, seconds in pool.imap_unordered(_run_tile, [(tile, symmetric) for tile in tiles]):
+                busy[pid] = busy.get(pid, 0.0) + seconds
+    finally:
+        for array in shared.values():
+            array.close(unlink=True)
+    if out_path is not None:
+        out.flush()
+    return out, busy
@@ -0,0 +1,222 @@
+import numpy as np
+from numba import jit, prange, get_num_threads, literally
+from dtw_numba import _cost, _COSINE, _COSINE_NORMALIZED, _condensed_to_pair
+
+__all__ = ['fastdtw', 'fastdtw_ragged', 'fastdtw_pdist']
+
+# Cells added around the projected path at every resolution
+RADIUS = 1
+
+
+def fastdtw(series1, series2, radius=RADIUS, normalized=False):
+    """
+    Approximate cosine DTW of two series with the FastDTW multiresolution
+    scheme (Salvador and Chan).
+
+    The series are coarsened by averaging pairs of adjacent embeddings
+    until they have at most radius + 2 timepoints, the DTW is solved
+    exactly at that resolution, and at every finer resolution only the
+    cells around the path projected from the coarser one (plus radius
+    cells on every side) are computed. The result is the cost of a valid
+    warping path, so it is never below the exact DTW.
+
+    Args:
+        series1, series2: arrays of shape [T1, D] and [T2, D]
+        radius: width added around the projected path, a larger radius is
+            slower and closer to the exact DTW
+        normalized: the timepoints have unit norm (see dtw_distance_ragged)
+
+    Returns:
+        The approximate DTW distance and the warping path as an array of
+        (i, j) pairs of shape [path length, 2]
+    """
+    metric = _COSINE_NORMALIZED if normalized else _COSINE
+    return _fastdtw(np.asarray(series1), np.asarray(series2), metric, radius)
+
+
+def fastdtw_ragged(embeddings1, offsets1, embeddings2, offsets2, radius=RADIUS, normalized=False):
+    """
+    Computes the approximate DTW distance matrix (see fastdtw) of two
+    ragged datasets (see ragged.py).
+
+    Returns:
+        Distance matrix of shape [N1, N2]
+    """
+    metric = _COSINE_NORMALIZED if normalized else _COSINE
+    return _fastdtw_ragged(embeddings1, offsets1, embeddings2, offsets2, metric, radius)
+
+
+def fastdtw_pdist(embeddings, offsets, radius=RADIUS, normalized=False, n_chunks=None):
+    """
+    Computes the approximate DTW distances (see fastdtw) between all the
+    pairs i < j of one ragged dataset, condensed as in
+    dtw_numba.dtw_pdist_ragged.
+
+    Returns:
+        Condensed distance array of shape [N * (N - 1) / 2]
+    """
+    if n_chunks is None:
+        n_chunks = get_num_threads()
+    metric = _COSINE_NORMALIZED if normalized else _COSINE
+    return _fastdtw_pdist(embeddings, offsets, metric, radius, n_chunks)
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _fastdtw_ragged(embeddings1, offsets1, embeddings2, offsets2, metric, radius):
+    literally(metric)
+    n1 = offsets1.shape[0] - 1
+    n2 = offsets2.shape[0] - 1
+
+    dist = np.empty((n1, n2), dtype=np.float64)
+
+    for i in prange(n1):
+        series1 = embeddings1[offsets1[i]:offsets1[i + 1]]
+        for j in range(n2):
+            dist[i, j], _ = _fastdtw(series1, embeddings2[offsets2[j]:offsets2[j + 1]], metric, radius)
+    return dist
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _fastdtw_pdist(embeddings, offsets, metric, radius, n_chunks):
+    literally(metric)
+    n = offsets.shape[0] - 1
+    n_pairs = n * (n - 1) // 2
+
+    dist = np.empty(n_pairs, dtype=np.float64)
+
+    for chunk in prange(n_chunks):
+        start = chunk * n_pairs // n_chunks
+        stop = (chunk + 1) * n_pairs // n_chunks
+        if start < stop:
+            i, j = _condensed_to_pair(start, n)
+            for k in range(start, stop):
+                dist[k], _ = _fastdtw(embeddings[offsets[i]:offsets[i + 1]],
+                                      embeddings[offsets[j]:offsets[j + 1]], metric, radius)
+                j += 1
+                if j == n:
+                    i += 1
+                    j = i + 1
+    return dist
+
+
+@jit(nopython=True, cache=True)
+def _fastdtw(series1, series2, metric, radius):
+    """
+    Returns the FastDTW distance and path of two series, see fastdtw.
+    """
+    literally(metric)
+    # Resolutions from the finest to the coarsest
+    levels1 = [np.ascontiguousarray(series1).astype(np.float64)]
+    levels2 = [np.ascontiguousarray(series2).astype(np.float64)]
+    while min(levels1[-1].shape[0], levels2[-1].shape[0]) > radius + 2:
+        levels1.append(_coarsen(levels1[-1]))
+        levels2.append(_coarsen(levels2[-1]))
+
+    # Exact DTW at the coarsest resolution
+    l1, l2 = levels1[-1].shape[0], levels2[-1].shape[0]
+    lo = np.zeros(l1, dtype=np.int64)
+    hi = np.full(l1, l2 - 1, dtype=np.int64)
+    distance, path = _dtw_window(levels1[-1], levels2[-1], metric, lo, hi)
+
+    for level in range(len(levels1) - 2, -1, -1):
+        l1, l2 = levels1[level].shape[0], levels2[level].shape[0]
+        lo, hi = _expand_path(path, l1, l2, radius)
+        distance, path = _dtw_window(levels1[level], levels2[level], metric, lo, hi)
+    return distance, path
+
+
+@jit(nopython=True, cache=True)
+def _coarsen(series):
+    """Halves the resolution of a series by averaging adjacent timepoints."""
+    n = series.shape[0]
+    coarse = np.empty(((n + 1) // 2, series.shape[1]))
+    for i in range(n // 2):
+        coarse[i] = (series[2 * i] + series[2 * i + 1]) / 2.0
+    if n % 2:
+        coarse[-1] = series[-1]
+    return coarse
+
+
+@jit(nopython=True, cache=True)
+def _expand_path(path, l1, l2, radius):
+    """
+    Returns the first and last columns of every row of the window at the
+    finer resolution: the cells of the path projected to it, plus radius
+    cells on every side.
+    """
+    lo = np.full(l1, l2, dtype=np.int64)
+    hi = np.full(l1, -1, dtype=np.int64)
+    for p in range(path.shape[0]):
+        i, j = path[p, 0], path[p, 1]
+        for row in range(max(0, 2 * i - radius), min(l1, 2 * i + 2 + radius)):
+            lo[row] = min(lo[row], max(0, 2 * j - radius))
+            hi[row] = max(hi[row], min(l2 - 1, 2 * j + 1 + radius))
+
+    lo[0] = 0
+    hi[l1 - 1] = l2 - 1
+    for i in range(1, l1):
+        # Every row must have a cell reachable from the previous row
+        if lo[i] > hi[i - 1] + 1:
+            lo[i] = hi[i - 1] + 1
+        if hi[i] < lo[i - 1]:
+            hi[i] = lo[i - 1]
+        if hi[i] < lo[i]:
+            hi[i] = lo[i]
+    return lo, hi
+
+
+@jit(nopython=True, cache=True)
+def _dtw_window(series1, series2, metric, lo, hi):
+    """
+    Returns the DTW distance and path of two series with only the cells
+    lo[i] <= j <= hi[i] of every row i, the other cells are infinite.
+    The cells of the window are stored row after row.
+    """
+    l1, l2 = series1.shape[0], series2.shape[0]
+    starts = np.empty(l1 + 1, dtype=np.int64)
+    starts[0] = 0
+    for i in range(l1):
+        starts[i + 1] = starts[i] + hi[i] - lo[i] + 1
+    E = np.empty(starts[l1])
+
+    for i in range(l1):
+        for j in range(lo[i], hi[i] + 1):
+            c = _cost(metric, series1[i], series2[j])
+            if i == 0 and j == 0:
+                E[0] = c
+                continue
+            best = np.inf
+            if i > 0:
+                best = min(best, _window_cell(E, starts, lo, hi, i - 1, j))
+                best = min(best, _window_cell(E, starts, lo, hi, i - 1, j - 1))
+            if j > lo[i]:
+                best = min(best, E[starts[i] + j - 1 - lo[i]])
+            E[starts[i] + j - lo[i]] = c + best
+
+    # Traceback from the last cell
+    path = np.empty((l1 + l2 - 1, 2), dtype=np.int64)
+    i, j = l1 - 1, l2 - 1
+    n = 0
+    path[n, 0], path[n, 1] = i, j
+    while i > 0 or j > 0:
+        diagonal = _window_cell(E, starts, lo, hi, i - 1, j - 1) if i > 0 and j > 0 else np.inf
+        up = _window_cell(E, starts, lo, hi, i - 1, j) if i > 0 else np.inf
+        left = _window_cell(E, starts, lo, hi, i, j - 1) if j > 0 else np.inf
+        if diagonal <= up and diagonal <= left:
+            i, j = i - 1, j - 1
+        elif up <= left:
+            i = i - 1
+        else:
+            j = j - 1
+        n += 1
+        path[n, 0], path[n, 1] = i, j
+
+    return E[starts[l1] - 1], path[:n + 1][::-1].copy()
+
+
+@jit(nopython=True, cache=True)
+def _window_cell(E, starts, lo, hi, i, j):
+    """Value of the cell (i, j), infinite out of the window."""
+    if j < lo[i] or j > hi[i]:
+        return np.inf
+    return E[starts[i] + j - lo[i]]
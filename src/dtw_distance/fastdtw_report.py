@@ -0,0 +1,95 @@
+import numpy as np
+import time
+import json
+import paths
+from scipy.stats import spearmanr
+from dtw_numba import dtw_pdist_ragged, squareform
+from fastdtw import fastdtw_pdist
+from ragged import load_ragged
+
+# Number of chains sampled for the comparison, the exact DTW of all their pairs is computed
+SAMPLE_SIZE = 1000
+
+# Radii of FastDTW compared with the exact DTW
+RADII = [0, 1, 2, 4]
+
+# Number of neighbours compared
+N_NEIGHBORS = 10
+
+def sample_chains(embeddings, offsets, sample_size, seed=0):
+    '''
+    Samples chains of a ragged dataset.
+
+    Args:
+    - embeddings (numpy.ndarray): Timepoints of all the chains.
+    - offsets (numpy.ndarray): Offsets of the chains.
+    - sample_size (int): Number of chains sampled.
+
+    Returns:
+    - tuple: Embeddings and offsets of the sampled chains.
+    '''
+    n = len(offsets) - 1
+    rng = np.random.default_rng(seed)
+    ids = np.sort(rng.choice(n, min(sample_size, n), replace=False))
+    lengths = offsets[ids + 1] - offsets[ids]
+    sample_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=sample_offsets[1:])
+    sample = np.concatenate([embeddings[offsets[i]:offsets[i + 1]] for i in ids])
+    return sample, sample_offsets
+
+def compare(exact, approx, n_neighbors=N_NEIGHBORS):
+    '''
+    Compares approximate condensed distances with the exact ones.
+
+    Args:
+    - exact (numpy.ndarray): Exact condensed distances.
+    - approx (numpy.ndarray): Approximate condensed distances.
+    - n_neighbors (int): Number of nearest neighbours compared.
+
+    Returns:
+    - dict: Relative errors, share of exact distances, rank correlation and neighbours overlap.
+    '''
+    relative = (approx - exact) / np.maximum(exact, 1e-12)
+    exact_square, approx_square = squareform(exact), squareform(approx)
+    np.fill_diagonal(exact_square, np.inf)
+    np.fill_diagonal(approx_square, np.inf)
+    k = min(n_neighbors, len(exact_square) - 1)
+    exact_knn = np.argsort(exact_square, axis=1)[:, :k]
+    approx_knn = np.argsort(approx_square, axis=1)[:, :k]
+    overlap = np.mean([len(np.intersect1d(a, b)) / k for a, b in zip(exact_knn, approx_knn)])
+    return {
+        'mean_relative_error': float(relative.mean()),
+        'median_relative_error': float(np.median(relative)),
+        'max_relative_error': float(relative.max()),
+        'exact_share': float(np.mean(np.isclose(approx, exact))),
+        'spearman': float(spearmanr(exact, approx)[0]),
+        f'knn_overlap_at_{k}': float(overlap),
+    }
+
+
+if __name__ == "__main__":
+
+    embeddings, offsets = load_ragged('../' + paths.EMB_CHAINS_RAGGED, '../' + paths.EMB_CHAINS_OFFSETS)
+    embeddings, offsets = sample_chains(embeddings, offsets, SAMPLE_SIZE)
+    print(f"{len(offsets) - 1} chains sampled")
+
+    # Compile the kernels before the timings
+    dtw_pdist_ragged(embeddings, offsets[:4])
+    fastdtw_pdist(embeddings, offsets[:4])
+
+    start_time = time.time()
+    exact = dtw_pdist_ragged(embeddings, offsets)
+    report = {'chains': len(offsets) - 1, 'exact_seconds': time.time() - start_time, 'fastdtw': {}}
+
+    for radius in RADII:
+        start_time = time.time()
+        approx = fastdtw_pdist(embeddings, offsets, radius=radius)
+        result = {'seconds': time.time() - start_time}
+        result.update(compare(exact, approx))
+        report['fastdtw'][radius] = result
+        print(f"Radius {radius}: {json.dumps(result)}")
+
+    with open('../' + paths.FASTDTW_REPORT, 'w') as file:
+        json.dump(report, file, indent=4)
+
+    print("The report is saved in fastdtw-report.json file!")
@@ -0,0 +1,119 @@
+import os
+import json
+import hashlib
+import numpy as np
+from tqdm import tqdm
+from ragged import take_series
+from tiled import compute_tile, save_manifest, TILE_SIZE
+from matrix_store import decode
+
+__all__ = ['chain_keys', 'load_keys', 'save_keys', 'update_distance_matrix']
+
+# Number of rows of the previous matrix copied at once
+COPY_BLOCK_ROWS = 1024
+
+
+def chain_keys(rows, offsets, files):
+    """
+    Returns a stable key of every chain: the SHA-1 of the files of its
+    emails, in order. The keys do not depend on the rows of the emails
+    in the embeddings store, which change when the store is rebuilt.
+
+    Args:
+        rows, offsets: chains as row ids of the embeddings store
+        files: email file of every row of the store (EMB_INDEX)
+
+    Returns:
+        List of N hexadecimal keys
+    """
+    keys = []
+    for i in range(len(offsets) - 1):
+        emails = '\n'.join(files[row] for row in rows[offsets[i]:offsets[i + 1]])
+        keys.append(hashlib.sha1(emails.encode('utf-8')).hexdigest())
+    return keys
+
+
+def load_keys(path):
+    """Returns the chain keys of a saved matrix, None if there are none."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_keys(path, keys):
+    # Same atomic write as the manifests of the tiled jobs
+    save_manifest(path, keys)
+
+
+def update_distance_matrix(embeddings, offsets, keys, old_keys, matrix_path, normalized=False,
+                           tile_size=TILE_SIZE, info=None):
+    """
+    Updates the DTW distance matrix of a previous run for a new set of
+    chains: the distances between chains already in the previous matrix
+    (same key) are copied from it, only the rows and columns of the new
+    chains are computed. Chains no longer present are dropped.
+
+    Adding m chains to N costs m * N DTW instead of N * N / 2.
+
+    The new matrix is written to a temporary file that replaces the
+    previous one at the end, so an interrupted update leaves the previous
+    matrix as it was.
+
+    Args:
+        embeddings, offsets: ragged dataset of all the chains, N series
+        keys: chain_keys of the chains
+        old_keys: chain_keys of the rows of the previous matrix
+        matrix_path: .npy file of the previous matrix (e.g. of run_tiled_dtw),
+            replaced by the [N, N] matrix
+        normalized: the timepoints have unit norm (see tiled.compute_tile)
+        tile_size: number of series per side of a tile of new distances
+        info: matrix_store.load_matrix_info of the previous matrix, the
+            distances of a float16 or uint16 matrix are decoded and the
+            updated matrix is float32 (to be encoded again)
+
+    Returns:
+        The distance matrix (memory map) and the number of new chains
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = len(offsets) - 1
+    old = np.load(matrix_path, mmap_mode='r')
+    if old.shape != (len(old_keys), len(old_keys)):
+        raise ValueError(f"The matrix of shape {old.shape} does not match the {len(old_keys)} chain keys")
+
+    old_index = {}
+    for i, key in enumerate(old_keys):
+        old_index.setdefault(key, i)
+    position = np.array([old_index.get(key, -1) for key in keys], dtype=np.int64)
+    kept = np.flatnonzero(position >= 0)
+    added = np.flatnonzero(position < 0)
+
+    dtype = old.dtype if old.dtype in (np.float32, np.float64) else np.float32
+    tmp_path = matrix_path[:-len('.npy')] + '.tmp.npy'
+    matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=(n, n))
+
+    # Distances between the kept chains, in blocks of whole rows (the new columns are filled below)
+    for start in range(0, len(kept), COPY_BLOCK_ROWS):
+        block = kept[start:start + COPY_BLOCK_ROWS]
+        rows = np.zeros((len(block), n), dtype=dtype)
+        old_rows = np.asarray(old[position[block]])
+        if info is not None:
+            old_rows = decode(old_rows, info)
+        rows[:, kept] = old_rows[:, position[kept]]
+        matrix[block] = rows
+
+    # Rows of the new chains against all the chains, mirrored to their columns
+    if len(added):
+        added_embeddings, added_offsets = take_series(embeddings, offsets, added)
+        for r0 in tqdm(range(0, len(added), tile_size), desc="Computing DTW of the new chains"):
+            r1 = min(r0 + tile_size, len(added))
+            for c0 in range(0, n, tile_size):
+                c1 = min(c0 + tile_size, n)
+                block = compute_tile(added_embeddings, added_offsets, embeddings, offsets, (r0, r1, c0, c1), normalized)
+                matrix[added[r0:r1], c0:c1] = block
+                matrix[c0:c1, added[r0:r1]] = block.T
+
+    matrix.flush()
+    del matrix, old
+    os.replace(tmp_path, matrix_path)
+    return np.load(matrix_path, mmap_mode='r+'), len(added)
@@ -0,0 +1,252 @@
+import numpy as np
+from numba import jit, prange, literally
+from dtw_numba import _max_length, _cost, _COSINE, _COSINE_NORMALIZED
+
+__all__ = ['fit_projection', 'project', 'envelopes', 'build_search_index', 'dtw_kneighbors']
+
+# Number of directions the timepoints are projected on for the envelope bound
+N_COMPONENTS = 16
+
+# Number of timepoints sampled to fit the projection
+SAMPLE_SIZE = 10000
+
+
+def fit_projection(embeddings, n_components=N_COMPONENTS, sample_size=SAMPLE_SIZE, seed=0):
+    """
+    Fits the projection of the envelope bound: the first principal
+    directions of a sample of the L2-normalized timepoints.
+
+    Args:
+        embeddings: timepoints of shape [n_timepoints, D]
+        n_components: number of directions
+        sample_size: number of timepoints used for the fit
+        seed: seed of the sample
+
+    Returns:
+        Orthonormal projection of shape [n_components, D]
+    """
+    rng = np.random.default_rng(seed)
+    if len(embeddings) > sample_size:
+        sample = np.asarray(embeddings[np.sort(rng.choice(len(embeddings), sample_size, replace=False))])
+    else:
+        sample = np.asarray(embeddings)
+    sample = _unit(sample.astype(np.float64))
+    _, _, vt = np.linalg.svd(sample, full_matrices=False)
+    return np.ascontiguousarray(vt[:min(n_components, len(vt))])
+
+
+def project(embeddings, projection):
+    """
+    Projects the L2-normalized timepoints.
+
+    Returns:
+        projected: coordinates of shape [n_timepoints, n_components]
+        residuals: norms of the parts orthogonal to the projection of
+            shape [n_timepoints]
+    """
+    unit = _unit(np.asarray(embeddings, dtype=np.float64))
+    projected = unit @ projection.T
+    residuals = np.sqrt(np.maximum(0.0, np.sum(unit * unit, axis=1) - np.sum(projected * projected, axis=1)))
+    return projected, residuals
+
+
+def envelopes(projected, residuals, offsets):
+    """
+    Returns the envelope of every series of a ragged dataset: the minimum
+    and maximum of its projected timepoints of shape [N, n_components] and
+    the maximal norm of their residuals of shape [N].
+    """
+    n = len(offsets) - 1
+    lower = np.empty((n, projected.shape[1]))
+    upper = np.empty((n, projected.shape[1]))
+    radius = np.empty(n)
+    for i in range(n):
+        lower[i] = projected[offsets[i]:offsets[i + 1]].min(axis=0)
+        upper[i] = projected[offsets[i]:offsets[i + 1]].max(axis=0)
+        radius[i] = residuals[offsets[i]:offsets[i + 1]].max()
+    return lower, upper, radius
+
+
+def build_search_index(embeddings, offsets, projection=None):
+    """
+    Precomputes what dtw_kneighbors needs about a ragged dataset: the
+    projected timepoints and the envelopes of the series.
+
+    Args:
+        embeddings, offsets: ragged dataset (see ragged.py)
+        projection: projection of fit_projection, fitted on the dataset if None
+
+    Returns:
+        Dict of the projection, projected timepoints, residuals and envelopes
+    """
+    if projection is None:
+        projection = fit_projection(embeddings)
+    projected, residuals = project(embeddings, projection)
+    lower, upper, radius = envelopes(projected, residuals, offsets)
+    return {'projection': projection, 'projected': projected, 'residuals': residuals,
+            'lower': lower, 'upper': upper, 'radius': radius}
+
+
+def dtw_kneighbors(embeddings, offsets, train_embeddings, train_offsets, n_neighbors=1,
+                   normalized=False, index=None, candidates=None):
+    """
+    Finds the n_neighbors nearest series of a training ragged dataset for
+    every series of a query ragged dataset, by cosine DTW, without
+    computing the DTW of most pairs.
+
+    For every query, a lower bound of the DTW to every candidate is the
+    largest of:
+    - LB_Kim: every warping path goes through the first and the last
+      cells, so the DTW is at least the sum of their costs
+    - the envelope bound: every timepoint of one series is aligned with
+      at least one timepoint of the other. For unit vectors,
+      a.b <= Pa.Pb + |a_res| |b_res| with P the projection (fit_projection),
+      so the cosine of a timepoint with any timepoint of the other series is
+      at most the maximum of Pa.z over the box of the projected envelope
+      plus |a_res| times the envelope radius. The bound is computed both ways.
+    The candidates are visited by increasing bound, the search of a query
+    stops at the first bound not below its current k-th distance, and the
+    DTW of the visited candidates is abandoned as soon as a whole row of
+    the cost matrix is above that distance.
+
+    Args:
+        embeddings, offsets: ragged query dataset, N series
+        train_embeddings, train_offsets: ragged training dataset
+        n_neighbors: number of neighbours
+        normalized: the timepoints have unit norm (see dtw_distance_ragged)
+        index: build_search_index of the training dataset, built if None
+        candidates: ids of the training series searched, all by default
+
+    Returns:
+        distances and indices of the neighbours of shape [N, n_neighbors],
+        sorted by increasing distance, and the number of full DTW computed
+        per query
+    """
+    if index is None:
+        index = build_search_index(train_embeddings, train_offsets)
+    if candidates is None:
+        candidates = np.arange(len(train_offsets) - 1)
+    candidates = np.asarray(candidates, dtype=np.int64)
+    n_neighbors = min(n_neighbors, len(candidates))
+
+    offsets = np.asarray(offsets, dtype=np.int64)
+    projected, residuals = project(embeddings, index['projection'])
+    lower, upper, radius = envelopes(projected, residuals, offsets)
+
+    metric = _COSINE_NORMALIZED if normalized else _COSINE
+    return _kneighbors(embeddings, offsets, projected, residuals, lower, upper, radius,
+                       train_embeddings, np.asarray(train_offsets, dtype=np.int64), index['projected'],
+                       index['residuals'], index['lower'], index['upper'], index['radius'],
+                       candidates, n_neighbors, metric)
+
+
+def _unit(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _kneighbors(embeddings, offsets, projected, residuals, lower, upper, radius,
+                train_embeddings, train_offsets, train_projected, train_residuals,
+                train_lower, train_upper, train_radius, candidates, k, metric):
+    literally(metric)
+    n = offsets.shape[0] - 1
+    n_candidates = candidates.shape[0]
+    max_length = _max_length(train_offsets)
+
+    distances = np.full((n, k), np.inf)
+    indices = np.full((n, k), -1, dtype=np.int64)
+    n_dtw = np.zeros(n, dtype=np.int64)
+
+    for q in prange(n):
+        row = np.empty(max(max_length, 1))
+        bounds = np.empty(n_candidates)
+        series1 = embeddings[offsets[q]:offsets[q + 1]]
+
+        for c in range(n_candidates):
+            t = candidates[c]
+            series2 = train_embeddings[train_offsets[t]:train_offsets[t + 1]]
+            bound = _lb_kim(series1, series2, metric)
+            bound = max(bound, _lb_envelope(projected[offsets[q]:offsets[q + 1]], residuals[offsets[q]:offsets[q + 1]],
+                                            train_lower[t], train_upper[t], train_radius[t]))
+            bound = max(bound, _lb_envelope(train_projected[train_offsets[t]:train_offsets[t + 1]],
+                                            train_residuals[train_offsets[t]:train_offsets[t + 1]],
+                                            lower[q], upper[q], radius[q]))
+            bounds[c] = bound
+
+        for c in np.argsort(bounds):
+            threshold = distances[q, k - 1]
+            if bounds[c] >= threshold:
+                break
+            t = candidates[c]
+            d = _dtw_row_abandon(series1, train_embeddings[train_offsets[t]:train_offsets[t + 1]], metric, row, threshold)
+            n_dtw[q] += 1
+            if d < threshold:
+                # Insert in the sorted neighbours
+                p = k - 1
+                while p > 0 and distances[q, p - 1] > d:
+                    distances[q, p] = distances[q, p - 1]
+                    indices[q, p] = indices[q, p - 1]
+                    p -= 1
+                distances[q, p] = d
+                indices[q, p] = t
+    return distances, indices, n_dtw
+
+
+@jit(nopython=True, cache=True)
+def _lb_kim(series1, series2, metric):
+    """Lower bound of the DTW from its first and last cells."""
+    bound = _cost(metric, series1[0], series2[0])
+    if series1.shape[0] > 1 or series2.shape[0] > 1:
+        bound += _cost(metric, series1[-1], series2[-1])
+    return bound
+
+
+@jit(nopython=True, cache=True)
+def _lb_envelope(projected, residuals, lower, upper, radius):
+    """
+    Lower bound of the DTW from the projected timepoints of one series and
+    the envelope of the other: the sum over the timepoints of the lowest
+    cosine distance possible to a point of the envelope.
+    """
+    bound = 0.0
+    for i in range(projected.shape[0]):
+        best = residuals[i] * radius
+        for d in range(projected.shape[1]):
+            best += max(projected[i, d] * lower[d], projected[i, d] * upper[d])
+        # The cosine distance is at least 1 - max(cosine, 0), also with the 1e-8 of _cosine
+        bound += 1.0 - min(max(best, 0.0), 1.0)
+    return bound
+
+
+@jit(nopython=True, cache=True)
+def _dtw_row_abandon(series1, series2, metric, row, threshold):
+    """
+    Same as dtw_numba._dtw_row, but returns infinity as soon as a whole
+    row of the cost matrix is above threshold: every path goes through
+    every row and the costs are not negative, so the DTW is above it too.
+    """
+    l1, l2 = series1.shape[0], series2.shape[0]
+
+    row[0] = _cost(metric, series1[0], series2[0])
+    row_min = row[0]
+    for j in range(1, l2):
+        row[j] = row[j - 1] + _cost(metric, series1[0], series2[j])
+        row_min = min(row_min, row[j])
+    if row_min > threshold:
+        return np.inf
+
+    for i in range(1, l1):
+        diagonal = row[0]
+        row[0] = diagonal + _cost(metric, series1[i], series2[0])
+        row_min = row[0]
+        for j in range(1, l2):
+            up = row[j]
+            row[j] = _cost(metric, series1[i], series2[j]) + min(up, row[j - 1], diagonal)
+            diagonal = up
+            row_min = min(row_min, row[j])
+        if row_min > threshold:
+            return np.inf
+
+    return row[l2 - 1]
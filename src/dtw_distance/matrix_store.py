@@ -0,0 +1,124 @@
+import os
+import json
+import numpy as np
+
+__all__ = ['MATRIX_DTYPES', 'encode_matrix', 'save_matrix_info', 'load_matrix_info', 'decode', 'load_matrix']
+
+# Types the distance matrix can be stored in: floats, or uint16 codes times a scale plus an offset
+MATRIX_DTYPES = ['float64', 'float32', 'float16', 'uint16']
+
+# Number of rows converted at once
+BLOCK_ROWS = 1024
+
+
+def encode_matrix(matrix, path, info_path, dtype='float32', block_rows=BLOCK_ROWS):
+    """
+    Writes a distance matrix to a .npy file in a compact type, in blocks of
+    rows, and its type, scale and offset to the JSON file info_path:
+    - 'float32': 2 times smaller than float64, relative error 6e-8
+    - 'float16': 4 times smaller, relative error 5e-4, the distances must
+      be between -65504 and 65504
+    - 'uint16': 4 times smaller, the distance d is stored as
+      round((d - offset) / scale) with offset = min(min distance, 0) (the
+      'inner' metric has negative distances) and scale = (max distance -
+      offset) / 65535, so the absolute error is at most scale / 2 for
+      every distance
+
+    The file is written through a temporary file, so matrix can be a
+    memory map of path itself (e.g. the matrix of run_tiled_dtw).
+
+    Args:
+        matrix: distance matrix of shape [N1, N2], can be a memory map
+        path: .npy file of the encoded matrix
+        info_path: JSON file of the type, the scale and the offset
+        dtype: one of MATRIX_DTYPES
+        block_rows: number of rows converted at once
+
+    Returns:
+        Dict of the type, scale and offset of the matrix (None for the floats)
+    """
+    if dtype not in MATRIX_DTYPES:
+        raise ValueError(f"Unknown matrix type {dtype!r}, expected one of {MATRIX_DTYPES}")
+
+    n1 = matrix.shape[0]
+    min_distance, max_distance = 0.0, 0.0
+    for start in range(0, n1, block_rows):
+        block = matrix[start:start + block_rows]
+        min_distance = min(min_distance, float(np.min(block, initial=0.0)))
+        max_distance = max(max_distance, float(np.max(block, initial=0.0)))
+    if dtype == 'float16' and max(-min_distance, max_distance) > float(np.finfo(np.float16).max):
+        raise ValueError(f"The distances from {min_distance} to {max_distance} do not fit in float16, use 'uint16'")
+    if dtype == 'uint16':
+        offset = min_distance
+        scale = (max_distance - offset) / np.iinfo(np.uint16).max
+    else:
+        offset, scale = None, None
+
+    tmp_path = path[:-len('.npy')] + '.tmp.npy'
+    encoded = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=dtype, shape=matrix.shape)
+    for start in range(0, n1, block_rows):
+        block = np.asarray(matrix[start:start + block_rows], dtype=np.float64)
+        if scale is not None:
+            block = np.round((block - offset) / scale) if scale > 0 else np.zeros_like(block)
+        encoded[start:start + block_rows] = block
+    encoded.flush()
+    del encoded
+    os.replace(tmp_path, path)
+
+    info = {'dtype': dtype, 'scale': scale, 'offset': offset}
+    save_matrix_info(info_path, info)
+    return info
+
+
+def save_matrix_info(info_path, info):
+    """
+    Writes the type, scale and offset of a matrix through a temporary file,
+    so an interruption leaves either the old or the new file, never half
+    of one.
+    """
+    tmp_path = info_path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(info, file)
+    os.replace(tmp_path, info_path)
+
+
+def load_matrix_info(path, info_path):
+    """
+    Returns the type, scale and offset of a stored matrix, from info_path
+    or, for the matrices saved without one, from the type of the .npy file.
+    """
+    if os.path.exists(info_path):
+        with open(info_path, 'r') as file:
+            info = json.load(file)
+        # The uint16 matrices saved before the offset was stored are not negative
+        info.setdefault('offset', None if info['scale'] is None else 0.0)
+        return info
+    return {'dtype': np.load(path, mmap_mode='r').dtype.name, 'scale': None, 'offset': None}
+
+
+def decode(block, info):
+    """Returns the distances of a block of a stored matrix as floats."""
+    if info['scale'] is None:
+        return block
+    return np.asarray(block, dtype=np.float32) * np.float32(info['scale']) + np.float32(info['offset'])
+
+
+def load_matrix(path, info_path, mmap=True, block_rows=BLOCK_ROWS):
+    """
+    Loads a matrix written by encode_matrix (or np.save), e.g. in
+    clustering.py. A float matrix is memory-mapped copy-on-write: nothing
+    is read until it is used and changes (e.g. the diagonal) are not
+    written back. A uint16 matrix is decoded to float32,
+    in blocks of rows.
+
+    Returns:
+        Distance matrix of shape [N1, N2]
+    """
+    info = load_matrix_info(path, info_path)
+    matrix = np.load(path, mmap_mode='c' if mmap else None)
+    if info['scale'] is None:
+        return matrix
+    decoded = np.empty(matrix.shape, dtype=np.float32)
+    for start in range(0, matrix.shape[0], block_rows):
+        decoded[start:start + block_rows] = decode(matrix[start:start + block_rows], info)
+    return decoded
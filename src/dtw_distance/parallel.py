@@ -60,48 +60,50 @@ exit_event = False
 threads_left_to_create = threading.Semaphore(MAX_THREAD_COUNT)
 writing_to_file_lock = threading.Lock()
 
-np.random.seed(0)  # For reproducibility
-time_series_set = [np.random.rand(np.random.randint(5, 15), 768) for _ in range(1800)]
-
-"""
-try:
-    data = np.genfromtxt("data.csv", delimiter=',',)
-    calculated_key = data[:,0]
-    calculated_result = data[:,1]
-    mask = numpy.isin(key_to_calculate, calculated_key)
-    key_to_calculate = key_to_calculate[~mask]
-    result_data_file = open("data.csv", "a")
-except:
-"""
-result_data_file = open("data.csv", "w+")
-
-
-# Register signal handlers based on platform
-if sys.platform.startswith('win'):
-    # Windows doesn't support signals other than SIGINT
-    signal.signal(signal.SIGINT, signal_handler)
-else:
-    # Unix-like platforms support multiple signals
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
-    signal.signal(signal.SIGUSR1, signal_handler)
-
-num_series = len(time_series_set)
-distance_matrix = np.zeros((num_series, num_series))
-
-start_time = time.time()
-
-# Calculate DTW distance between each pair of time series with progress bar
-for i in tqdm(range(num_series), desc="Calculating DTW distances"):
-    for j in range(i+1, num_series):
-        threading.Thread(target = single_thread_calculator(i*num_series+j, time_series_set[i], time_series_set[j])).start()
-        threads_left_to_create.acquire()
-        if exit_event:
-            break
+if __name__ == "__main__":
+
+    np.random.seed(0)  # For reproducibility
+    time_series_set = [np.random.rand(np.random.randint(5, 15), 768) for _ in range(1800)]
+
+    """
+    try:
+        data = np.genfromtxt("data.csv", delimiter=',',)
+        calculated_key = data[:,0]
+        calculated_result = data[:,1]
+        mask = numpy.isin(key_to_calculate, calculated_key)
+        key_to_calculate = key_to_calculate[~mask]
+        result_data_file = open("data.csv", "a")
+    except:
+    """
+    result_data_file = open("data.csv", "w+")
+
+
+    # Register signal handlers based on platform
+    if sys.platform.startswith('win'):
+        # Windows doesn't support signals other than SIGINT
+        signal.signal(signal.SIGINT, signal_handler)
+    else:
+        # Unix-like platforms support multiple signals
+        signal.signal(signal.SIGINT, signal_handler)
+        signal.signal(signal.SIGTERM, signal_handler)
+        signal.signal(signal.SIGUSR1, signal_handler)
+
+    num_series = len(time_series_set)
+    distance_matrix = np.zeros((num_series, num_series))
+
+    start_time = time.time()
+
+    # Calculate DTW distance between each pair of time series with progress bar
+    for i in tqdm(range(num_series), desc="Calculating DTW distances"):
+        for j in range(i+1, num_series):
+            threading.Thread(target = single_thread_calculator(i*num_series+j, time_series_set[i], time_series_set[j])).start()
+            threads_left_to_create.acquire()
+            if exit_event:
+                break
         
-end_time = time.time()
-time_taken = end_time - start_time
+    end_time = time.time()
+    time_taken = end_time - start_time
 
-result_data_file.close()
+    result_data_file.close()
 
-print(f"Time taken: {time_taken:.2f} seconds")
+    print(f"Time taken: {time_taken:.2f} seconds")
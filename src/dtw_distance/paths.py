@@ -18,4 +18,18 @@ CHAINS_10_PLUS = 'data/chains/chains_10_plus.json'
 EMB_MAILS = 'data/mails-embeddings.csv'
 EMB_CHAINS = 'data/chains/emb-chains.json'
 
-DIST_MATRIX = 'data/distance_matrix/dist-matrix.npy'
\ No newline at end of file
+EMB_MATRIX = 'data/chains/mails-embeddings.npy'
+EMB_INDEX = 'data/chains/mails-embeddings-index.json'
+EMB_CHAINS_ROWS = 'data/chains/emb-chains-rows.npz'
+EMB_CHAINS_RAGGED = 'data/chains/emb-chains-ragged.npy'
+EMB_CHAINS_OFFSETS = 'data/chains/emb-chains-offsets.npy'
+EMB_CHAINS_NORMALIZED = 'data/chains/emb-chains-normalized.npy'
+
+DIST_MATRIX = 'data/distance_matrix/dist-matrix.npy'
+DIST_MATRIX_INFO = 'data/distance_matrix/dist-matrix-info.json'
+DIST_GRAPH = 'data/distance_matrix/dist-graph.npz'
+DIST_MANIFEST = 'data/distance_matrix/dist-matrix-manifest.json'
+DIST_KEYS = 'data/distance_matrix/dist-matrix-keys.json'
+FASTDTW_REPORT = 'data/distance_matrix/fastdtw-report.json'
+CANDIDATES_REPORT = 'data/distance_matrix/candidates-report.json'
+BENCHMARK_REPORT = 'data/distance_matrix/benchmark.json'
\ No newline at end of file
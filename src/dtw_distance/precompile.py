@@ -0,0 +1,100 @@
+import time
+import numpy as np
+from numba import types, from_dtype
+import dtw_numba
+import dtw_blas
+import schedule
+import sparse_graph
+import fastdtw
+import alignment
+
+__all__ = ['kernel_signatures', 'compile_kernels']
+
+# Types of the embeddings the kernels are compiled for
+DTYPES = (np.float32, np.float64)
+
+# Metric codes of the kernels of dtw_numba, compiled for each code (literal argument)
+METRIC_CODES = sorted(set(dtw_numba._METRICS.values()) | {dtw_numba._COSINE_NORMALIZED})
+
+# Metric codes of the other kernels, which compute the cosine DTW only
+COSINE_CODES = (dtw_numba._COSINE, dtw_numba._COSINE_NORMALIZED)
+
+
+def _array(dtype, ndim, layout='C', readonly=False):
+    return types.Array(from_dtype(np.dtype(dtype)), ndim, layout, readonly=readonly)
+
+
+def kernel_signatures(dtype, readonly=False):
+    """
+    Returns the signatures of the DTW kernels for the embeddings of one
+    type, as they are called by the entry points of the modules: int64
+    offsets and codes, float64 results. The kernels take the metric code
+    as a literal, they have one signature per metric code.
+
+    Args:
+        dtype: type of the embeddings, np.float32 or np.float64
+        readonly: the embeddings are read-only (np.load with mmap_mode='r')
+
+    Returns:
+        List of (jitted kernel, signature)
+    """
+    embeddings = _array(dtype, 2, readonly=readonly)
+    offsets = _array(np.int64, 1)
+    similarity = _array(dtype, 2)
+    i8, f8 = types.int64, types.float64
+    band = (i8, i8, f8, f8)
+
+    signatures = []
+    for code in METRIC_CODES:
+        metric = types.literal(code)
+        signatures += [
+            (dtw_numba._dtw_ragged, (embeddings, offsets, embeddings, offsets, metric) + band),
+            (dtw_numba._dtw_pdist, (embeddings, offsets, metric, i8) + band),
+        ]
+    for code in COSINE_CODES:
+        metric = types.literal(code)
+        signatures += [
+            (schedule._dtw_tile, (embeddings, offsets, offsets, embeddings, offsets, offsets, metric,
+                                  types.boolean, types.boolean, _array(np.float64, 2))),
+            (sparse_graph._knn_heaps, (embeddings, offsets, metric, i8)),
+            (sparse_graph._radius_block, (embeddings, offsets, i8, i8, metric, f8)),
+            (fastdtw._fastdtw_ragged, (embeddings, offsets, embeddings, offsets, metric, i8)),
+            (fastdtw._fastdtw_pdist, (embeddings, offsets, metric, i8, i8)),
+            (alignment._dtw_paths, (embeddings, offsets, embeddings, offsets, _array(np.int64, 2), metric, i8,
+                                    offsets)),
+        ]
+    return signatures + [
+        # The block of the result is contiguous when it has all the columns
+        (dtw_blas._dtw_similarity_block, (similarity, offsets, offsets, _array(np.float64, 2))),
+        (dtw_blas._dtw_similarity_block, (similarity, offsets, offsets, _array(np.float64, 2, 'A'))),
+        (dtw_blas._dtw_similarity_block_condensed, (similarity, offsets, offsets, i8, i8, i8, _array(np.float64, 1))),
+    ]
+
+
+def compile_kernels(dtypes=DTYPES):
+    """
+    Compiles the DTW kernels for the float32 and float64 embeddings,
+    writable and read-only, ahead of the jobs. The kernels are cached on
+    disk (cache=True), so this is only slow the first time after an
+    install or a change of the code: the next processes, e.g. the
+    workers of dtw_pool, load the compiled kernels from the cache
+    instead of compiling them. Other types are still compiled on their
+    first call.
+
+    Returns:
+        Number of signatures and seconds taken
+    """
+    start_time = time.time()
+    n_signatures = 0
+    for dtype in dtypes:
+        for readonly in (False, True):
+            for kernel, signature in kernel_signatures(dtype, readonly):
+                kernel.compile(signature)
+                n_signatures += 1
+    return n_signatures, time.time() - start_time
+
+
+if __name__ == "__main__":
+
+    n_signatures, seconds = compile_kernels()
+    print(f"{n_signatures} kernel signatures compiled or loaded from the cache in {seconds:.2f} seconds")
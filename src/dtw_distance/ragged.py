@@ -0,0 +1,136 @@
+import numpy as np
+
+__all__ = ['to_ragged', 'from_embedding_store', 'normalize', 'save_ragged', 'load_ragged', 'get_series', 'take_series']
+
+
+def to_ragged(time_series_set, dtype=np.float32):
+    """
+    Converts a list of timeseries into the ragged layout: all the
+    timepoints in one contiguous array and the offsets of every series.
+
+    Args:
+        time_series_set: list of N arrays of shape [T_i, D]
+        dtype: type of the values of the embeddings array
+
+    Returns:
+        embeddings of shape [sum T_i, D] and int64 offsets of shape [N + 1],
+        series i is embeddings[offsets[i]:offsets[i + 1]]
+    """
+    lengths = np.array([len(series) for series in time_series_set], dtype=np.int64)
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    dim = time_series_set[0].shape[1] if len(time_series_set) else 0
+    embeddings = np.empty((offsets[-1], dim), dtype=dtype)
+    for i, series in enumerate(time_series_set):
+        embeddings[offsets[i]:offsets[i + 1]] = series
+    return embeddings, offsets
+
+
+def from_embedding_store(matrix, rows, offsets, path=None, dtype=np.float32, block_size=65536):
+    """
+    Gathers the chains from the embeddings store (email matrix and row ids
+    of the chains) into the ragged layout, in blocks of rows.
+
+    Args:
+        matrix: embeddings of all the emails of shape [n_emails, D]
+        rows: row ids of the chain emails of shape [sum T_i]
+        offsets: offsets of the chains in rows of shape [N + 1]
+        path: if given, the embeddings are written to this .npy file
+            through a memory map instead of being kept in memory
+        dtype: type of the values of the embeddings array
+        block_size: number of rows gathered at once
+
+    Returns:
+        embeddings of shape [sum T_i, D] (a memory map if path is given)
+        and the offsets
+    """
+    shape = (len(rows), matrix.shape[1])
+    if path is None:
+        embeddings = np.empty(shape, dtype=dtype)
+    else:
+        embeddings = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+
+    for start in range(0, len(rows), block_size):
+        stop = min(start + block_size, len(rows))
+        embeddings[start:stop] = matrix[rows[start:stop]]
+
+    if path is not None:
+        embeddings.flush()
+    return embeddings, np.asarray(offsets, dtype=np.int64)
+
+
+def normalize(embeddings, path=None, dtype=np.float32, block_size=65536):
+    """
+    L2-normalizes every timepoint, in blocks of rows, so that the cosine
+    distance becomes 1 - dot product (see dtw_distance_ragged). Timepoints
+    with zero norm are left as zeros.
+
+    Args:
+        embeddings: array of shape [n_timepoints, D], can be a memory map
+        path: if given, the result is written to this .npy file through a
+            memory map instead of being kept in memory
+        dtype: type of the values of the result
+        block_size: number of rows normalized at once
+
+    Returns:
+        Normalized embeddings of shape [n_timepoints, D]
+    """
+    if path is None:
+        normalized = np.empty(embeddings.shape, dtype=dtype)
+    else:
+        normalized = np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=embeddings.shape)
+
+    for start in range(0, len(embeddings), block_size):
+        block = np.asarray(embeddings[start:start + block_size], dtype=np.float64)
+        norms = np.linalg.norm(block, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        normalized[start:start + block_size] = block / norms
+
+    if path is not None:
+        normalized.flush()
+    return normalized
+
+
+def save_ragged(embeddings_path, offsets_path, embeddings, offsets):
+    np.save(embeddings_path, embeddings)
+    np.save(offsets_path, offsets)
+
+
+def load_ragged(embeddings_path, offsets_path, mmap=True):
+    """
+    Loads a dataset in the ragged layout.
+
+    Args:
+        embeddings_path, offsets_path: .npy files written by save_ragged
+            or from_embedding_store
+        mmap: memory-map the embeddings instead of reading them in memory
+
+    Returns:
+        embeddings of shape [sum T_i, D] and offsets of shape [N + 1]
+    """
+    embeddings = np.load(embeddings_path, mmap_mode='r' if mmap else None)
+    offsets = np.load(offsets_path)
+    return embeddings, offsets
+
+
+def get_series(embeddings, offsets, i):
+    """Returns the view of series i of a ragged dataset, without copy."""
+    return embeddings[offsets[i]:offsets[i + 1]]
+
+
+def take_series(embeddings, offsets, ids, dtype=np.float32):
+    """
+    Gathers the series ids of a ragged dataset into a new ragged dataset.
+
+    Returns:
+        embeddings of shape [sum T_i of the ids, D] and offsets of shape
+        [len(ids) + 1]
+    """
+    lengths = offsets[1:][ids] - offsets[:-1][ids]
+    new_offsets = np.zeros(len(ids) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    new_embeddings = np.empty((new_offsets[-1], embeddings.shape[1]), dtype=dtype)
+    for k, i in enumerate(ids):
+        new_embeddings[new_offsets[k]:new_offsets[k + 1]] = embeddings[offsets[i]:offsets[i + 1]]
+    return new_embeddings, new_offsets
@@ -0,0 +1,212 @@
+import threading
+import time
+import numpy as np
+from numba import jit, get_num_threads, literally
+from dtw_numba import _dtw_row, _max_length, _cost, _COSINE, _COSINE_NORMALIZED
+
+__all__ = ['pair_cost', 'cost_balanced_blocks', 'make_tiles', 'dtw_distance_scheduled', 'print_report']
+
+
+def pair_cost(lengths1, lengths2):
+    """
+    Estimated cost of the DTW of every pair of series: l1 * l2 cells.
+
+    Args:
+        lengths1: lengths of the series of dataset 1 of shape [N1]
+        lengths2: lengths of the series of dataset 2 of shape [N2]
+
+    Returns:
+        Array of shape [N1, N2]
+    """
+    return np.outer(lengths1, lengths2)
+
+
+def cost_balanced_blocks(lengths, n_blocks):
+    """
+    Cuts the series, sorted by decreasing length, into consecutive blocks
+    with about the same total length. The DTW cost of a block of rows
+    against a block of columns is the product of their total lengths, so
+    blocks balanced on both sides give tiles of about the same cost.
+
+    Args:
+        lengths: lengths of the series of shape [N]
+        n_blocks: number of blocks, at most N
+
+    Returns:
+        order: series ids sorted by decreasing length of shape [N]
+        bounds: int64 array of shape [n_blocks + 1], block b is
+            order[bounds[b]:bounds[b + 1]]
+    """
+    lengths = np.asarray(lengths, dtype=np.int64)
+    n_blocks = max(1, min(n_blocks, len(lengths)))
+    order = np.argsort(-lengths, kind='stable')
+
+    cumulative = np.cumsum(lengths[order])
+    targets = cumulative[-1] * np.arange(1, n_blocks) / n_blocks
+    cuts = np.searchsorted(cumulative, targets, side='left') + 1
+
+    bounds = np.concatenate(([0], cuts, [len(lengths)])).astype(np.int64)
+    # A long series can cover several targets, drop the empty blocks
+    bounds = np.unique(bounds)
+    return order, bounds
+
+
+def make_tiles(lengths1, lengths2, n_tiles, symmetric=False):
+    """
+    Splits the distance matrix into about n_tiles tiles of about the same
+    estimated cost (see cost_balanced_blocks), sorted by decreasing cost so
+    that the most expensive tiles are handed out first.
+
+    With symmetric=True the two datasets are the same and only the tiles on
+    and above the diagonal of the sorted order are made.
+
+    Args:
+        lengths1, lengths2: lengths of the series of the two datasets
+        n_tiles: wanted number of tiles
+        symmetric: the datasets are the same
+
+    Returns:
+        order1, order2: series ids of the datasets in the sorted order
+        tiles: int64 array of shape [n_tiles, 5] of (row start, row stop,
+            column start, column stop, cost) in the sorted order
+    """
+    lengths1 = np.asarray(lengths1, dtype=np.int64)
+    lengths2 = np.asarray(lengths2, dtype=np.int64)
+
+    if symmetric:
+        # About half of the blocks pairs are kept
+        n_blocks = int(np.ceil(np.sqrt(2 * n_tiles)))
+        order1, bounds1 = cost_balanced_blocks(lengths1, n_blocks)
+        order2, bounds2 = order1, bounds1
+    else:
+        n_blocks = int(np.ceil(np.sqrt(n_tiles)))
+        order1, bounds1 = cost_balanced_blocks(lengths1, n_blocks)
+        order2, bounds2 = cost_balanced_blocks(lengths2, n_blocks)
+
+    cumulative1 = np.concatenate(([0], np.cumsum(lengths1[order1])))
+    cumulative2 = np.concatenate(([0], np.cumsum(lengths2[order2])))
+
+    tiles = []
+    for bi in range(len(bounds1) - 1):
+        r0, r1 = bounds1[bi], bounds1[bi + 1]
+        for bj in range(bi if symmetric else 0, len(bounds2) - 1):
+            c0, c1 = bounds2[bj], bounds2[bj + 1]
+            cost = (cumulative1[r1] - cumulative1[r0]) * (cumulative2[c1] - cumulative2[c0])
+            if symmetric and bi == bj:
+                cost //= 2
+            tiles.append((r0, r1, c0, c1, cost))
+
+    tiles = np.array(tiles, dtype=np.int64).reshape(-1, 5)
+    tiles = tiles[np.argsort(-tiles[:, 4], kind='stable')]
+    return order1, order2, tiles
+
+
+def dtw_distance_scheduled(embeddings1, offsets1, embeddings2, offsets2, normalized=False,
+                           symmetric=False, n_threads=None, tiles_per_thread=8, report=False):
+    """
+    Computes the dataset DTW distance matrix of two ragged datasets (see
+    ragged.py) with a dynamic, cost-balanced schedule.
+
+    The cost of a pair is estimated as l1 * l2 and the matrix is split into
+    tiles of about the same cost (make_tiles). The tiles are handed out
+    from a shared queue, most expensive first, to n_threads Python threads,
+    each running the nogil Numba kernel on one tile at a time. A thread
+    that got cheap tiles takes the next one instead of waiting, so the
+    threads with long chains are no longer stragglers as with the static
+    prange split of the rows.
+
+    Args:
+        embeddings1, offsets1: ragged dataset 1, N1 series
+        embeddings2, offsets2: ragged dataset 2, N2 series
+        normalized: the timepoints have unit norm (see dtw_distance_ragged)
+        symmetric: the datasets are the same, only the pairs of one side
+            of the diagonal are computed and mirrored, the diagonal is zero
+        n_threads: number of threads, the Numba number of threads by default
+        tiles_per_thread: number of tiles per thread, more tiles balance
+            better but cost more scheduling
+        report: also return the per-thread utilization report
+
+    Returns:
+        Distance matrix of shape [N1, N2], and with report=True a dict with
+        the wall time and, for every thread, the tiles, pairs, estimated
+        cost, busy time and utilization (busy time / wall time)
+    """
+    if n_threads is None:
+        n_threads = get_num_threads()
+    metric = _COSINE_NORMALIZED if normalized else _COSINE
+
+    offsets1 = np.asarray(offsets1, dtype=np.int64)
+    offsets2 = np.asarray(offsets2, dtype=np.int64)
+    n1, n2 = len(offsets1) - 1, len(offsets2) - 1
+    order1, order2, tiles = make_tiles(np.diff(offsets1), np.diff(offsets2),
+                                       n_threads * tiles_per_thread, symmetric)
+
+    dist = np.zeros((n1, n2), dtype=np.float64)
+
+    next_tile = [0]
+    lock = threading.Lock()
+    threads_stats = [{'thread': t, 'tiles': 0, 'pairs': 0, 'cost': 0, 'busy': 0.0} for t in range(n_threads)]
+
+    def worker(stats):
+        while True:
+            with lock:
+                k = next_tile[0]
+                next_tile[0] += 1
+            if k >= len(tiles):
+                return
+            r0, r1, c0, c1, tile_cost = tiles[k]
+            tile_start = time.perf_counter()
+            pairs = _dtw_tile(embeddings1, offsets1, order1[r0:r1], embeddings2, offsets2, order2[c0:c1],
+                              metric, symmetric, symmetric and r0 == c0, dist)
+            stats['busy'] += time.perf_counter() - tile_start
+            stats['tiles'] += 1
+            stats['pairs'] += pairs
+            stats['cost'] += int(tile_cost)
+
+    start_time = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(stats,)) for stats in threads_stats]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start_time
+
+    if not report:
+        return dist
+
+    for stats in threads_stats:
+        stats['utilization'] = stats['busy'] / wall if wall > 0 else 0.0
+    return dist, {'wall': wall, 'tiles': len(tiles), 'threads': threads_stats}
+
+
+@jit(nopython=True, nogil=True, cache=True)
+def _dtw_tile(embeddings1, offsets1, rows, embeddings2, offsets2, columns, metric, symmetric, diagonal, out):
+    """
+    Fills out[rows[a], columns[b]] with the DTW distances of one tile.
+    In a symmetric job out[columns[b], rows[a]] is filled too, and only
+    the pairs a < b are computed in a diagonal tile. Returns the number
+    of pairs computed.
+    """
+    literally(metric)
+    pairs = 0
+    # One row buffer for all the pairs of the tile
+    row = np.empty(max(_max_length(offsets2), 1))
+    for a in range(rows.shape[0]):
+        i = rows[a]
+        series1 = embeddings1[offsets1[i]:offsets1[i + 1]]
+        for b in range(a + 1 if diagonal else 0, columns.shape[0]):
+            j = columns[b]
+            out[i, j] = _dtw_row(series1, embeddings2[offsets2[j]:offsets2[j + 1]], metric, row)
+            if symmetric:
+                out[j, i] = out[i, j]
+            pairs += 1
+    return pairs
+
+
+def print_report(report):
+    """Prints the per-thread utilization report of dtw_distance_scheduled."""
+    print(f"Wall time: {report['wall']:.2f} seconds, {report['tiles']} tiles")
+    for stats in report['threads']:
+        print(f"Thread {stats['thread']}: {stats['tiles']} tiles, {stats['pairs']} pairs, "
+              f"cost {stats['cost']}, busy {stats['busy']:.2f} s, "
+              f"utilization {100 * stats['utilization']:.1f}%")
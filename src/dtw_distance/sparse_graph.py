@@ -0,0 +1,179 @@
+import numpy as np
+from numba import jit, prange, literally
+from scipy.sparse import csr_matrix, save_npz, load_npz
+from dtw_numba import _max_length, _cost, _COSINE, _COSINE_NORMALIZED
+from lower_bounds import _dtw_row_abandon
+
+__all__ = ['dtw_knn_graph', 'dtw_radius_graph', 'save_graph', 'load_graph']
+
+# Number of distances held in memory at once by dtw_radius_graph
+BLOCK_VALUES = 8000000
+
+
+def dtw_knn_graph(embeddings, offsets, n_neighbors, normalized=False):
+    """
+    Computes the graph of the n_neighbors nearest chains of every chain of
+    a ragged dataset (see ragged.py) by DTW, without the N x N matrix.
+
+    Every row keeps its neighbours in a bounded max-heap of n_neighbors
+    entries during the computation, and the DTW of a candidate is
+    abandoned as soon as it is sure to be above the top of the full heap,
+    so the memory is O(N * n_neighbors).
+
+    The graph is in the format of the sklearn sparse precomputed distances
+    (as sklearn.neighbors.kneighbors_graph with mode='distance'): the
+    neighbours of a row are sorted by distance, a chain is not its own
+    neighbour and zero distances are stored explicitly. DBSCAN on it
+    gives the same result as on the dense matrix when eps is below the
+    distance to the n_neighbors-th neighbour of every chain.
+
+    Args:
+        embeddings, offsets: ragged dataset, N series
+        n_neighbors: number of neighbours per chain, >= 1, at most N - 1
+        normalized: the timepoints have unit norm (see dtw_distance_ragged)
+
+    Returns:
+        scipy.sparse.csr_matrix of shape [N, N]
+    """
+    if n_neighbors < 1:
+        raise ValueError(f"n_neighbors must be >= 1, got {n_neighbors}")
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = len(offsets) - 1
+    n_neighbors = min(n_neighbors, n - 1)
+    if n_neighbors < 1:
+        # A single chain has no neighbours
+        return csr_matrix((n, n))
+    metric = _COSINE_NORMALIZED if normalized else _COSINE
+
+    distances, indices = _knn_heaps(embeddings, offsets, metric, n_neighbors)
+
+    indptr = np.arange(0, n * n_neighbors + 1, n_neighbors, dtype=np.int64)
+    return csr_matrix((distances.ravel(), indices.ravel(), indptr), shape=(n, n))
+
+
+def dtw_radius_graph(embeddings, offsets, max_distance, normalized=False, block_values=BLOCK_VALUES):
+    """
+    Computes the graph of all the pairs of chains of a ragged dataset (see
+    ragged.py) with a DTW distance of at most max_distance, without the
+    N x N matrix.
+
+    Only the pairs i < j are computed, in blocks of rows, and the DTW of
+    a pair is abandoned as soon as it is sure to be above max_distance.
+    DBSCAN on the graph gives the same result as on the dense matrix for
+    any eps <= max_distance. The format is that of dtw_knn_graph.
+
+    Args:
+        embeddings, offsets: ragged dataset, N series
+        max_distance: largest distance kept
+        normalized: the timepoints have unit norm (see dtw_distance_ragged)
+        block_values: number of distances computed per block of rows
+
+    Returns:
+        scipy.sparse.csr_matrix of shape [N, N]
+    """
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n = len(offsets) - 1
+    metric = _COSINE_NORMALIZED if normalized else _COSINE
+    block_rows = max(1, block_values // max(n, 1))
+
+    rows, columns, values = [], [], []
+    for r0 in range(0, n, block_rows):
+        r1 = min(r0 + block_rows, n)
+        block = _radius_block(embeddings, offsets, r0, r1, metric, float(max_distance))
+        block_i, block_j = np.nonzero(block <= max_distance)
+        rows.append(block_i + r0)
+        columns.append(block_j)
+        values.append(block[block_i, block_j])
+
+    rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+    columns = np.concatenate(columns) if columns else np.empty(0, dtype=np.int64)
+    values = np.concatenate(values) if values else np.empty(0)
+
+    # Both orientations of every pair, every row sorted by distance
+    rows, columns = np.concatenate((rows, columns)), np.concatenate((columns, rows))
+    values = np.concatenate((values, values))
+    order = np.lexsort((values, rows))
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+    return csr_matrix((values[order], columns[order], indptr), shape=(n, n))
+
+
+def save_graph(path, graph):
+    save_npz(path, graph)
+
+
+def load_graph(path):
+    return load_npz(path)
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _knn_heaps(embeddings, offsets, metric, k):
+    """
+    Returns the distances and indices of the k nearest neighbours of every
+    series, sorted by distance, from one bounded max-heap per row.
+    """
+    literally(metric)
+    n = offsets.shape[0] - 1
+    max_length = _max_length(offsets)
+
+    distances = np.empty((n, k))
+    indices = np.empty((n, k), dtype=np.int64)
+
+    for i in prange(n):
+        row = np.empty(max(max_length, 1))
+        heap_distances = np.full(k, np.inf)
+        heap_indices = np.full(k, -1, dtype=np.int64)
+        series1 = embeddings[offsets[i]:offsets[i + 1]]
+
+        for j in range(n):
+            if j == i or k == 0:
+                continue
+            # The top of the heap is the k-th distance so far
+            d = _dtw_row_abandon(series1, embeddings[offsets[j]:offsets[j + 1]], metric, row, heap_distances[0])
+            if d < heap_distances[0]:
+                heap_distances[0] = d
+                heap_indices[0] = j
+                _sift_down(heap_distances, heap_indices)
+
+        order = np.argsort(heap_distances)
+        distances[i] = heap_distances[order]
+        indices[i] = heap_indices[order]
+    return distances, indices
+
+
+@jit(nopython=True, cache=True)
+def _sift_down(heap_distances, heap_indices):
+    """Restores the max-heap after the replacement of its top."""
+    k = heap_distances.shape[0]
+    p = 0
+    while True:
+        largest = p
+        for child in (2 * p + 1, 2 * p + 2):
+            if child < k and heap_distances[child] > heap_distances[largest]:
+                largest = child
+        if largest == p:
+            return
+        heap_distances[p], heap_distances[largest] = heap_distances[largest], heap_distances[p]
+        heap_indices[p], heap_indices[largest] = heap_indices[largest], heap_indices[p]
+        p = largest
+
+
+@jit(nopython=True, parallel=True, nogil=True, cache=True)
+def _radius_block(embeddings, offsets, r0, r1, metric, max_distance):
+    """
+    Returns the DTW distances of the series r0 to r1 with the series after
+    them, infinite for the other pairs and the abandoned ones.
+    """
+    literally(metric)
+    n = offsets.shape[0] - 1
+    max_length = _max_length(offsets)
+
+    block = np.full((r1 - r0, n), np.inf)
+
+    for bi in prange(r1 - r0):
+        i = r0 + bi
+        row = np.empty(max(max_length, 1))
+        series1 = embeddings[offsets[i]:offsets[i + 1]]
+        for j in range(i + 1, n):
+            block[bi, j] = _dtw_row_abandon(series1, embeddings[offsets[j]:offsets[j + 1]], metric, row, max_distance)
+    return block
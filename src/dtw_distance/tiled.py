@@ -0,0 +1,181 @@
+import os
+import json
+import hashlib
+import signal
+import threading
+import numpy as np
+from tqdm import tqdm
+from dtw_numba import dtw_distance_ragged
+from dtw_blas import dtw_distance_blas
+
+__all__ = ['tile_grid', 'load_manifest', 'save_manifest', 'input_fingerprint', 'compute_tile', 'run_tiled_dtw']
+
+# Number of series per side of a tile, a float64 tile of 1024 x 1024 is 8 MB
+TILE_SIZE = 1024
+
+
+def tile_grid(n1, n2, tile_size=TILE_SIZE, symmetric=False):
+    """
+    Splits the [n1, n2] distance matrix into square tiles, row by row.
+    With symmetric=True only the tiles on and above the diagonal are made.
+
+    Returns:
+        List of (row start, row stop, column start, column stop), the id
+        of a tile is its position in the list
+    """
+    tiles = []
+    for r0 in range(0, n1, tile_size):
+        for c0 in range(r0 if symmetric else 0, n2, tile_size):
+            tiles.append((r0, min(r0 + tile_size, n1), c0, min(c0 + tile_size, n2)))
+    return tiles
+
+
+def load_manifest(path):
+    """Returns the manifest of a tiled job, None if there is none yet."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def save_manifest(path, manifest):
+    """
+    Writes the manifest of a tiled job through a temporary file, so an
+    interruption leaves either the old or the new manifest, never half of one.
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file)
+    os.replace(tmp_path, path)
+
+
+def input_fingerprint(offsets, keys=None, files=()):
+    """
+    Returns a fingerprint of the input data of a tiled job: the SHA-1 of
+    the offsets of the series, of their keys (e.g. incremental.chain_keys)
+    and of the size and modification time of the files they come from
+    (e.g. the embeddings store), so that a job is only resumed on the
+    same data.
+
+    Args:
+        offsets: offsets of the ragged dataset
+        keys: list of str identifying the series, optional
+        files: paths of the input files, optional
+
+    Returns:
+        Hexadecimal fingerprint
+    """
+    digest = hashlib.sha1(np.ascontiguousarray(offsets, dtype=np.int64).tobytes())
+    for key in keys or ():
+        digest.update(key.encode('utf-8') + b'\n')
+    for path in files:
+        stat = os.stat(path)
+        digest.update(f"{os.path.abspath(path)} {stat.st_size} {stat.st_mtime_ns}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def compute_tile(embeddings1, offsets1, embeddings2, offsets2, tile, normalized=False):
+    """
+    Computes one tile of the DTW distance matrix of two ragged datasets.
+
+    Args:
+        embeddings1, offsets1: ragged dataset 1
+        embeddings2, offsets2: ragged dataset 2
+        tile: (row start, row stop, column start, column stop)
+        normalized: the timepoints have unit norm, the local costs are then
+            computed by BLAS (dtw_distance_blas)
+
+    Returns:
+        Distance matrix of the tile
+    """
+    r0, r1, c0, c1 = tile
+    tile_offsets1 = offsets1[r0:r1 + 1]
+    tile_offsets2 = offsets2[c0:c1 + 1]
+    if normalized:
+        return dtw_distance_blas(embeddings1, tile_offsets1, embeddings2, tile_offsets2)
+    return dtw_distance_ragged(embeddings1, tile_offsets1, embeddings2, tile_offsets2)
+
+
+def run_tiled_dtw(embeddings1, offsets1, embeddings2, offsets2, matrix_path, manifest_path,
+                  normalized=False, symmetric=False, tile_size=TILE_SIZE, dtype=np.float64, fingerprint=None):
+    """
+    Computes the DTW distance matrix of two ragged datasets tile by tile
+    into a memory-mapped .npy file, so the matrix is never held in memory.
+
+    Every finished tile is flushed to disk and its id added to the manifest.
+    SIGINT and SIGTERM stop the job after the current tile. Calling the
+    function again with the same arguments and input data (same
+    fingerprint) resumes the job: the finished tiles, read from the
+    manifest, are not computed again. After a crash at most the tile in
+    progress is lost. The manifest is deleted once the job is complete,
+    so only an interrupted job is ever resumed.
+
+    Args:
+        embeddings1, offsets1: ragged dataset 1, N1 series
+        embeddings2, offsets2: ragged dataset 2, N2 series
+        matrix_path: .npy file of the [N1, N2] distance matrix
+        manifest_path: JSON file of the job parameters and finished tiles
+        normalized: the timepoints have unit norm (see compute_tile)
+        symmetric: the datasets are the same, only the tiles on and above
+            the diagonal are computed and mirrored
+        tile_size: number of series per side of a tile
+        dtype: type of the values of the matrix
+        fingerprint: input_fingerprint of the data, of the offsets of both
+            datasets if None
+
+    Returns:
+        The distance matrix (memory map) and True if the job is complete,
+        False if it was stopped by a signal
+    """
+    n1, n2 = len(offsets1) - 1, len(offsets2) - 1
+    if fingerprint is None:
+        fingerprint = input_fingerprint(np.concatenate([offsets1, offsets2]))
+    params = {'shape': [n1, n2], 'tile_size': tile_size, 'symmetric': symmetric,
+              'normalized': normalized, 'dtype': np.dtype(dtype).str, 'fingerprint': fingerprint}
+    tiles = tile_grid(n1, n2, tile_size, symmetric)
+
+    manifest = load_manifest(manifest_path)
+    if manifest is not None and manifest['params'] == params and os.path.exists(matrix_path):
+        matrix = np.load(matrix_path, mmap_mode='r+')
+        done = set(manifest['done'])
+        print(f"Resuming: {len(done)} of {len(tiles)} tiles already computed")
+    else:
+        matrix = np.lib.format.open_memmap(matrix_path, mode='w+', dtype=dtype, shape=(n1, n2))
+        manifest = {'params': params, 'done': []}
+        done = set()
+        save_manifest(manifest_path, manifest)
+
+    # Stop after the current tile on SIGINT/SIGTERM, signals can only be handled in the main thread
+    stop = [False]
+
+    def signal_handler(sig, frame):
+        stop[0] = True
+
+    handled = threading.current_thread() is threading.main_thread()
+    if handled:
+        old_handlers = {sig: signal.signal(sig, signal_handler) for sig in (signal.SIGINT, signal.SIGTERM)}
+
+    try:
+        for k in tqdm([k for k in range(len(tiles)) if k not in done], desc="Computing DTW tiles"):
+            if stop[0]:
+                break
+            r0, r1, c0, c1 = tiles[k]
+            block = compute_tile(embeddings1, offsets1, embeddings2, offsets2, tiles[k], normalized)
+            matrix[r0:r1, c0:c1] = block
+            if symmetric and c0 != r0:
+                matrix[c0:c1, r0:r1] = block.T
+            matrix.flush()
+
+            manifest['done'].append(k)
+            save_manifest(manifest_path, manifest)
+    finally:
+        if handled:
+            for sig, handler in old_handlers.items():
+                signal.signal(sig, handler)
+
+    complete = len(manifest['done']) == len(tiles)
+    if complete:
+        os.remove(manifest_path)
+    else:
+        print(f"Stopped: {len(manifest['done'])} of {len(tiles)} tiles computed, run again to resume")
+    return matrix, complete
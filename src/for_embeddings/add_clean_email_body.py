@@ -4,8 +4,12 @@ import matplotlib.pyplot as plt
 import re
 import json
 from collections import Counter
+from functools import lru_cache
 import paths
 
+# Number of distinct email bodies kept in the cleaning cache
+CACHE_SIZE = 100000
+
 def modify_attachement(text):
     '''Replace the names of the attachement files.
     
@@ -34,83 +38,80 @@ def modify_attachement(text):
     
     return text
 
-def count_words(text):
-    words = re.findall(r'\w+', text)
-    return len(words)
-
-def remove_from_pattern(message, pattern):
-    match = re.search(pattern, message, flags=re.IGNORECASE)
-    if match:
-        message = message[:match.start()]
-    return message
+# Markers cutting the body, matched case-insensitively in this order
+CUT_PATTERNS = [re.compile(pattern, flags=re.IGNORECASE) for pattern in [
+    r'Original Message',
+    r'Forwarded by',
+    r'Sent by:',
+    r'From:',
+    ]]
+WORD_PATTERN = re.compile(r'\w')
 
 def extract_between_original_messages(text):
     # Define the marker
     marker = "Original Message"
     forwarded_phrase = "Forwarded by"
     
-    # Find the positions of the first two "Original Message" instances
+    # Find the position of the first "Original Message" instance
     first_pos = text.find(marker)
-    second_pos = text.find(marker, first_pos + len(marker))
-    # Check if there are at least two "Original Message" instances
-    if (first_pos != -1) and (second_pos != -1) and not(forwarded_phrase in text):
-        # Extract the text between the two "Original Message" instances
-        start_index = first_pos + len(marker)
-        end_index = second_pos
-        extracted_text = text[start_index:end_index].strip()
-    elif (first_pos != -1) and not(forwarded_phrase in text):
-        start_index = first_pos + len(marker)
-        extracted_text = text[start_index:].strip()
-    else:
+    if (first_pos == -1) or (forwarded_phrase in text):
         return ""
     
-    return extracted_text
+    # Extract the text up to the second "Original Message" instance, if there is one
+    start_index = first_pos + len(marker)
+    end_index = text.find(marker, start_index)
+    if end_index == -1:
+        end_index = len(text)
+    
+    return text[start_index:end_index].strip()
 
-def remove_forwarded_sections(text):
+def forwarded_sections_bounds(text):
     # Define the markers
     forward_marker = "Forwarded by"
     subject_marker = "Subject:"
     
+    # The searches continue from offsets in the text instead of re-slicing it,
+    # so every marker occurrence is found once and nothing is copied
+    start_index, end_index = 0, len(text)
     first_pos = text.find(forward_marker)
     second_pos = text.find(subject_marker, first_pos + len(forward_marker))
     
     while (first_pos != -1) and (second_pos != -1):
         start_index = second_pos + len(subject_marker)
-        text = text[start_index:]
-        first_pos = text.find(forward_marker)
+        first_pos = text.find(forward_marker, start_index)
         if first_pos != -1:
             second_pos = text.find(subject_marker, first_pos + len(forward_marker))
-            if first_pos > 35:
+            if first_pos - start_index > 35:
                 end_index = first_pos
-                text = text[:end_index]
-                return text
-    return text
+                break
+    return start_index, end_index
+
+def remove_forwarded_sections(text):
+    start_index, end_index = forwarded_sections_bounds(text)
+    return text[start_index:end_index]
 
 def clean_email_body(body):
-    orig_body = body[:]
-    patterns = [
-    r'Original Message',
-    r'Forwarded by',
-    r'Sent by:',
-    r'From:',
-    ]
+    # Cut the body at the first marker, every search is limited to the part before the current cut
+    cut = len(body)
+    for pattern in CUT_PATTERNS:
+        match = pattern.search(body, 0, cut)
+        if match:
+            cut = match.start()
 
-    for pattern in patterns:
-        body = remove_from_pattern(body, pattern)
+    if WORD_PATTERN.search(body, 0, cut):
+        return body[:cut].strip()
 
-    if count_words(body) == 0:
-        body = orig_body[:]
-        body = extract_between_original_messages(body)
-        
-    if count_words(body) == 0:
-        body = orig_body[:]
-        body = remove_forwarded_sections(body)
-        marker = "Original Message"
-        pos = body.find(marker)
-        if (pos != -1):
-            body = body[:pos]
+    extracted_text = extract_between_original_messages(body)
+    if WORD_PATTERN.search(extracted_text):
+        return extracted_text
+
+    start_index, end_index = forwarded_sections_bounds(body)
+    marker = "Original Message"
+    pos = body.find(marker, start_index, end_index)
+    if (pos != -1):
+        end_index = pos
 
-    return body.strip()
+    return body[start_index:end_index].strip()
 
 
 def where_to_insert_original_message(text):
@@ -217,6 +218,26 @@ def clean_text_further(text):
 
     return text
 
+def clean_body(content):
+    '''Applies all the cleaning steps to the email body.
+    
+    Args:
+    - content (str): Email body.
+    
+    Returns:
+    - tuple: The body after every step: attachements replaced, initial cleaning,
+      quoted and forwarded parts removed, further cleaning.
+    '''
+    content_attachement = modify_attachement(content)
+    content_new = clean_text_initial(content_attachement)
+    content_new_1 = clean_email_body(content_new)
+    content_new_2 = clean_text_further(content_new_1)
+    return content_attachement, content_new, content_new_1, content_new_2
+
+# Identical bodies (quoted replies, mass mailings, missed duplicates) are cleaned once,
+# cache_info() gives the number of hits and misses
+cached_clean_body = lru_cache(maxsize=CACHE_SIZE)(clean_body)
+
 def add_subject_to_content(row, name_col_content):
     return f"Subject: {row['subject-clean']}. {row[name_col_content]}"
 
@@ -301,10 +322,9 @@ if __name__ == "__main__":
     print(f"Number of NaNs for every column:\n{nan_counts}")
 
     
-    df_chains['content-attachement'] = df_chains['content'].apply(modify_attachement)
-    df_chains['content-new'] = df_chains['content-attachement'].apply(clean_text_initial)
-    df_chains['content-new-1'] = df_chains['content-new'].apply(clean_email_body)
-    df_chains['content-new-2'] = df_chains['content-new-1'].apply(clean_text_further)
+    steps = ['content-attachement', 'content-new', 'content-new-1', 'content-new-2']
+    df_chains[steps] = pd.DataFrame(df_chains['content'].map(cached_clean_body).tolist(), index=df_chains.index)
+    print(f"Cleaning cache: {cached_clean_body.cache_info()}")
     df_chains['content-new-2'] = df_chains.apply(add_subject_to_content, args=('content-new-2',), axis=1)
     df_chains['content-new-2'] = df_chains.apply(add_attachement_to_content, args=('content-new-2',), axis=1)
     
@@ -322,38 +342,9 @@ if __name__ == "__main__":
         print(i, ': ', empty_body.iloc[i])
     
 
-    df_chains['word_count'] = df_chains['content'].apply(count_words)
-    df_chains['word_count'] = df_chains['content-new-2'].apply(count_words)
-    df_chains['word_count'].max()
-    
-    df_chains.loc[df_chains['word_count']<600]['word_count'].plot(kind='hist', bins=100, edgecolor='black')
-    df_chains['word_count'].plot(kind='hist', bins=100, edgecolor='black')
-    # Add labels and title
-    plt.xlabel('Values')
-    plt.ylabel('Frequency')
-    plt.title('Distribution of Values')
-
-    # Show plot
-    plt.show()
-    df_chains['word_count'].median()
-    len(df_chains.loc[df_chains['word_count']<10])
-    
-    with open('../'+paths.CHECK_CHAINS + f'null-body.txt', 'w') as combined_file:
-        for ind, cont in df_chains.loc[df_chains['word_count']<10, ['content', 'content-new-2']].iterrows():
-            combined_file.write('\n'*3 + '#' * 10 + ' ' * 15 + 'Message' + ' ' * 16 + '#' * 10 + '\n'*3)
-            combined_file.write(cont['content'])
-            combined_file.write('\n'*3 + '#' * 10 + ' ' * 15 + 'Cleaned' + ' ' * 16 + '#' * 10 + '\n'*3)
-            combined_file.write(cont['content-new-2'])
-
-        
-    df_to_emb = df_chains.copy()
-    df_to_emb.reset_index(inplace=True)
-    columns_to_drop = ['Message-ID', 'Date', 'From', 'To', 'Subject', 'Cc', 'Mime-Version',
-       'Content-Type', 'Content-Transfer-Encoding', 'Bcc', 'X-From', 'X-To', 'X-cc', 'X-bcc', 
-       'X-Folder', 'X-Origin', 'X-FileName', 'content-clean', 'content',
-       'content-attachement', 'content-new', 'content-new-1', 'word_count']
-    df_to_emb.drop(columns=columns_to_drop, inplace=True)
-    df_to_emb.to_csv('../data/mails-for-emb.csv', index=False)
+    # Save the body variants of the chain emails: text_stats.py adds their word, character and
+    # token counts, inspect_body.py reads them and exports the emails to embed
+    df_chains.to_csv('../' + paths.DATA_CHAINS_CLEAN)
     
 
 
@@ -5,6 +5,10 @@ import re
 import json
 import paths
 import ast
+from embedding_store import build_embedding_store, load_embedding_store, chains_to_rows, save_chain_rows, export_json_chains
+
+# Also write the chains embeddings in the JSON format
+EXPORT_JSON = False
 
 def extract_heading_name(heading):
     # Define a regular expression pattern to match the heading structure
@@ -44,12 +48,14 @@ if __name__ == "__main__":
     with open('../' + paths.EMB_MAILS, 'r') as file:
         embedding_dict = json.load(file)
 
-    # Initialize the resulting dictionary
-    emb_chains = {}
-
-    # Populate the resulting dictionary
-    for chain, emails in chains.items():
-        emb_chains[chain] = [embedding_dict[email] for email in emails]
-
-    with open('../' +paths.EMB_CHAINS, 'w') as file:
-        json.dump(emb_chains, file)  
+    # Store the embeddings as one float32 matrix, the chains are offsets into its rows
+    index = build_embedding_store(embedding_dict, '../' + paths.EMB_MATRIX, '../' + paths.EMB_INDEX)
+    del embedding_dict
+    rows, offsets = chains_to_rows(chains, index)
+    save_chain_rows('../' + paths.EMB_CHAINS_ROWS, rows, offsets)
+    print("\nThe embeddings store is created!")
+
+    # The chains embeddings in JSON, only needed by the scripts still reading EMB_CHAINS
+    if EXPORT_JSON:
+        matrix, _ = load_embedding_store('../' + paths.EMB_MATRIX, '../' + paths.EMB_INDEX)
+        export_json_chains(matrix, rows, offsets, list(chains.keys()), '../' + paths.EMB_CHAINS)
@@ -0,0 +1,93 @@
+import numpy as np
+import json
+
+def build_embedding_store(embedding_dict, matrix_path, index_path, dtype=np.float32):
+    '''
+    Save the email embeddings as one contiguous matrix and the file -> row index.
+
+    The matrix is written to a .npy file row by row through a memory map, so only
+    one embedding is converted at a time. The index is the list of email files
+    in the order of the rows.
+
+    Args:
+    - embedding_dict (dict): The embeddings (lists of floats) indexed by email file.
+    - matrix_path (str): The path of the .npy matrix file.
+    - index_path (str): The path of the JSON index file.
+    - dtype (numpy.dtype): The type of the stored values, float32 by default.
+
+    Returns:
+    - dict: The row of every email file in the matrix.
+    '''
+    files = list(embedding_dict.keys())
+    dim = len(embedding_dict[files[0]]) if files else 0
+
+    matrix = np.lib.format.open_memmap(matrix_path, mode='w+', dtype=dtype, shape=(len(files), dim))
+    for row, file in enumerate(files):
+        matrix[row] = embedding_dict[file]
+    matrix.flush()
+    del matrix
+
+    with open(index_path, 'w') as file:
+        json.dump(files, file)
+
+    return {file: row for row, file in enumerate(files)}
+
+def load_embedding_store(matrix_path, index_path, mmap=True):
+    '''
+    Load the email embeddings matrix and the file -> row index.
+
+    Args:
+    - matrix_path (str): The path of the .npy matrix file.
+    - index_path (str): The path of the JSON index file.
+    - mmap (bool): Memory-map the matrix instead of reading it in memory.
+
+    Returns:
+    - tuple: The matrix of shape [n_emails, D] and the dict with the row of every email file.
+    '''
+    matrix = np.load(matrix_path, mmap_mode='r' if mmap else None)
+    with open(index_path, 'r') as file:
+        files = json.load(file)
+    return matrix, {file: row for row, file in enumerate(files)}
+
+def chains_to_rows(chains, index):
+    '''
+    Represent the chains as row ids of the embeddings matrix.
+
+    The rows of chain i are rows[offsets[i]:offsets[i+1]], in the order of the chains dictionary.
+
+    Args:
+    - chains (dict): The lists of email files indexed by chain name.
+    - index (dict): The row of every email file in the embeddings matrix.
+
+    Returns:
+    - tuple: The int64 arrays rows of shape [n_emails_in_chains] and offsets of shape [n_chains + 1].
+    '''
+    lengths = [len(emails) for emails in chains.values()]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    rows = np.fromiter((index[email] for emails in chains.values() for email in emails),
+                       dtype=np.int64, count=offsets[-1])
+    return rows, offsets
+
+def save_chain_rows(path, rows, offsets):
+    np.savez(path, rows=rows, offsets=offsets)
+
+def load_chain_rows(path):
+    with np.load(path) as data:
+        return data['rows'], data['offsets']
+
+def export_json_chains(matrix, rows, offsets, names, path):
+    '''
+    Write the embeddings of the chains in the JSON format (lists of lists of floats per chain name).
+
+    Args:
+    - matrix (numpy.ndarray): The embeddings matrix.
+    - rows, offsets (numpy.ndarray): The chains as returned by chains_to_rows.
+    - names (list): The chain names, in the order of the chains.
+    - path (str): The path of the JSON file.
+    '''
+    emb_chains = {}
+    for i, name in enumerate(names):
+        emb_chains[name] = matrix[rows[offsets[i]:offsets[i + 1]]].tolist()
+    with open(path, 'w') as file:
+        json.dump(emb_chains, file)
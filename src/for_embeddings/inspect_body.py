@@ -0,0 +1,47 @@
+import pandas as pd
+import matplotlib.pyplot as plt
+import paths
+from text_stats import STATS_COLUMNS, STATS
+
+# Emails whose cleaned body has fewer words are written to null-body.txt for checking
+MIN_WORDS = 10
+
+# Longest bodies (in words) shown in the zoomed histogram
+HIST_MAX_WORDS = 600
+
+if __name__ == "__main__":
+
+    # Chain emails with their body variants (add_clean_email_body.py) and statistics (text_stats.py)
+    df_chains = pd.read_csv('../' + paths.DATA_CHAINS_CLEAN, index_col='file', keep_default_na=False)
+
+    # Word counts of the body after the cleaning, stored by text_stats.py
+    word_count = df_chains['content-new-2-word-count']
+    print(f"Words per body: max {word_count.max()}, median {word_count.median()}")
+
+    word_count[word_count<HIST_MAX_WORDS].plot(kind='hist', bins=100, edgecolor='black')
+    word_count.plot(kind='hist', bins=100, edgecolor='black')
+    # Add labels and title
+    plt.xlabel('Values')
+    plt.ylabel('Frequency')
+    plt.title('Distribution of Values')
+
+    # Show plot
+    plt.show()
+    print(f"Bodies with fewer than {MIN_WORDS} words: {len(df_chains.loc[word_count<MIN_WORDS])}")
+
+    with open('../'+paths.CHECK_CHAINS + f'null-body.txt', 'w') as combined_file:
+        for ind, cont in df_chains.loc[word_count<MIN_WORDS, ['content', 'content-new-2']].iterrows():
+            combined_file.write('\n'*3 + '#' * 10 + ' ' * 15 + 'Message' + ' ' * 16 + '#' * 10 + '\n'*3)
+            combined_file.write(cont['content'])
+            combined_file.write('\n'*3 + '#' * 10 + ' ' * 15 + 'Cleaned' + ' ' * 16 + '#' * 10 + '\n'*3)
+            combined_file.write(cont['content-new-2'])
+
+    df_to_emb = df_chains.copy()
+    df_to_emb.reset_index(inplace=True)
+    columns_to_drop = ['Message-ID', 'Date', 'From', 'To', 'Subject', 'Cc', 'Mime-Version',
+       'Content-Type', 'Content-Transfer-Encoding', 'Bcc', 'X-From', 'X-To', 'X-cc', 'X-bcc',
+       'X-Folder', 'X-Origin', 'X-FileName', 'content-clean', 'content',
+       'content-attachement', 'content-new', 'content-new-1']
+    columns_to_drop += [f'{column}-{stat}' for column in STATS_COLUMNS for stat in STATS]
+    df_to_emb.drop(columns=columns_to_drop, inplace=True)
+    df_to_emb.to_csv('../data/mails-for-emb.csv', index=False)
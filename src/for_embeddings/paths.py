@@ -1,5 +1,6 @@
 DATA_CLEAN_SUBJECT = 'data/clean-mails-data.csv'
 DATA_CLEAN_SUBJECT_INF = 'data/clean-mails-data-inf.csv'
+DATA_CHAINS_CLEAN = 'data/chains/chains-mails-clean.csv'
 
 CHECK_CHAINS = 'data/check-chains/'
 
@@ -18,4 +19,8 @@ CHAINS = 'data/chains/chains.json'
 
 MAILS_TO_EMB = 'data/mails-for-emb.csv.csv'
 EMB_MAILS = 'data/chains/mails-embeddings.json'
-EMB_CHAINS = 'data/chains/emb-chains.json'
\ No newline at end of file
+EMB_CHAINS = 'data/chains/emb-chains.json'
+
+EMB_MATRIX = 'data/chains/mails-embeddings.npy'
+EMB_INDEX = 'data/chains/mails-embeddings-index.json'
+EMB_CHAINS_ROWS = 'data/chains/emb-chains-rows.npz'
@@ -0,0 +1,53 @@
+import os
+import sys
+import paths
+
+# Helpers shared by the stages that stream the dataset
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parsing_and_cleaning'))
+from chunked_csv import read_chunks, write_chunk
+
+# Body variants of the chain emails (add_clean_email_body.py), their statistics are inspected in inspect_body.py
+STATS_COLUMNS = ['content', 'content-clean', 'content-attachement', 'content-new', 'content-new-1', 'content-new-2']
+
+# Statistics added for every body variant
+STATS = ['word-count', 'char-count', 'token-count']
+
+# Average number of characters per token, used to estimate the length of a text in tokens
+CHARS_PER_TOKEN = 4
+
+def add_text_stats(df, columns):
+    '''
+    Add the word count, character count and estimated token count of text columns to the DataFrame.
+
+    The statistics are computed with vectorized string methods, so the texts are scanned
+    once per column and never split into lists of words. For a column 'content' the new
+    columns are 'content-word-count', 'content-char-count' and 'content-token-count'.
+
+    Args:
+    - df (pandas.DataFrame): The DataFrame with the text columns.
+    - columns (list): The names of the text columns (body variants).
+
+    Returns:
+    - pandas.DataFrame: The same DataFrame with the statistics columns added.
+    '''
+    for column in columns:
+        texts = df[column].fillna('')
+        char_count = texts.str.len()
+        df[f'{column}-word-count'] = texts.str.count(r'\w+')
+        df[f'{column}-char-count'] = char_count
+        df[f'{column}-token-count'] = (char_count + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return df
+
+
+if __name__ == "__main__":
+
+    tmp_path = '../' + paths.DATA_CHAINS_CLEAN + '.tmp'
+
+    # Store the statistics in the dataset of add_clean_email_body.py, so the later steps read them
+    # instead of re-tokenizing. The file is rewritten, so bodies such as 'NA' or 'null' stay text
+    for first, df in read_chunks('../' + paths.DATA_CHAINS_CLEAN, keep_default_na=False):
+        df = add_text_stats(df, STATS_COLUMNS)
+        write_chunk(df, tmp_path, first)
+
+    os.replace(tmp_path, '../' + paths.DATA_CHAINS_CLEAN)
+    print("Text statistics are added to the dataset!")
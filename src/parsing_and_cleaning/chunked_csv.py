@@ -0,0 +1,32 @@
+import pandas as pd
+
+# Number of rows held in memory at once
+CHUNK_SIZE = 50000
+
+def read_chunks(path, chunk_size=CHUNK_SIZE, keep_default_na=True):
+    '''
+    Read a CSV file chunk by chunk, so the memory usage does not depend on the size of the dataset.
+
+    Args:
+    - path (str): The CSV file.
+    - chunk_size (int): The number of rows of a chunk.
+    - keep_default_na (bool): Parse 'NA', 'null', 'nan'... as missing values, False to keep
+      them as text (e.g. when the file is rewritten).
+
+    Returns:
+    - iterator: (first, chunk) pairs, first is True for the first chunk only.
+    '''
+    for i, df in enumerate(pd.read_csv(path, chunksize=chunk_size, keep_default_na=keep_default_na)):
+        yield i == 0, df
+
+def write_chunk(df, path, first):
+    '''
+    Write a chunk to a CSV file: the first chunk creates the file with the header,
+    the next ones are appended to it.
+
+    Args:
+    - df (pandas.DataFrame): The chunk.
+    - path (str): The CSV file.
+    - first (bool): Whether it is the first chunk written to the file.
+    '''
+    df.to_csv(path, mode='w' if first else 'a', header=first, index=False)
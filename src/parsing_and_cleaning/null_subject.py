@@ -1,6 +1,7 @@
 import pandas as pd
 import re
 import paths
+from chunked_csv import read_chunks, write_chunk
 
 def remove_prefixes(subject):
     """
@@ -31,34 +32,59 @@ def remove_spaces(subject):
     subject = ' '.join(subject.split())
     return subject
 
+def add_clean_subject(df):
+    """
+    Add the 'subject-clean' column to a chunk of the dataset.
+
+    Args:
+    - df (pandas.DataFrame): A chunk of the dataset with the 'Subject' column.
+
+    Returns:
+    - pandas.DataFrame: The chunk with the cleaned subject lines in 'subject-clean'.
+    """
+    df = df.copy()
+    df['subject-clean'] = df['Subject'].fillna('')
+    df['subject-clean'] = df['subject-clean'].apply(remove_prefixes).apply(remove_spaces)
+    return df
+
 if __name__ == "__main__":
-    # Read the DataFrame from the CSV file
-    df = pd.read_csv(paths.DATA_NO_DUPLICATE)
+    size = 0
+    n_columns = 0
+    nan_counts = None
+    n_empty_subject = 0
+    n_non_empty_subject = 0
 
-    # Drop rows where 'To' field is unknown (NaN)
-    df = df.dropna(subset=['To'])
+    # Read the DataFrame from the CSV file chunk by chunk, so the memory usage
+    # does not depend on the size of the dataset
+    for first, df in read_chunks(paths.DATA_NO_DUPLICATE):
+        # Drop rows where 'To' field is unknown (NaN)
+        df = df.dropna(subset=['To'])
+        size += len(df)
+        n_columns = df.shape[1]
 
-    # Display the size of the dataset
-    print(f"\nThe dataset's size: {df.shape}\n")
+        # Count the number of NaNs for each column
+        chunk_nan_counts = df.isna().sum()
+        nan_counts = chunk_nan_counts if nan_counts is None else nan_counts + chunk_nan_counts
 
-    # Count the number of NaNs for each column
-    nan_counts = df.isna().sum()
-    print(f"Number of NaNs for every column:\n{nan_counts}")
+        # Clean the subject lines by removing prefixes and spaces
+        df = add_clean_subject(df)
 
-    # Clean the subject lines by removing prefixes and spaces
-    df['subject-clean'] = df['Subject'].fillna('')
-    df['subject-clean'] = df['subject-clean'].apply(remove_prefixes).apply(remove_spaces)
+        # Split the chunk into two based on whether subject lines are empty or not
+        df_empty_subject = df[df['subject-clean'] == '']
+        df_non_empty_subject = df[df['subject-clean'] != '']
+        n_empty_subject += len(df_empty_subject)
+        n_non_empty_subject += len(df_non_empty_subject)
+
+        # Append the cleaned chunks to the CSV files, the first chunk creates them
+        write_chunk(df_empty_subject, paths.DATA_CLEAN_EMPTY_SUBJECT, first)
+        write_chunk(df_non_empty_subject, paths.DATA_CLEAN_SUBJECT, first)
+
+    # Display the size of the dataset
+    print(f"\nThe dataset's size: {(size, n_columns)}\n")
+    print(f"Number of NaNs for every column:\n{nan_counts}")
 
-    # Split the dataset into two based on whether subject lines are empty or not
-    df_empty_subject = df[df['subject-clean'] == '']
-    df_non_empty_subject = df[df['subject-clean'] != '']
-    
     # Display the size of datasets with empty and non-empty subject lines
-    print(f"\nThe dataset's size with empty subject: {df_empty_subject.shape}\n")
-    print(f"\nThe dataset's size with subject: {df_non_empty_subject.shape}\n")
+    print(f"\nThe dataset's size with empty subject: {(n_empty_subject, n_columns + 1)}\n")
+    print(f"\nThe dataset's size with subject: {(n_non_empty_subject, n_columns + 1)}\n")
 
-    # Save the cleaned datasets to CSV files
-    df_empty_subject.to_csv(paths.DATA_CLEAN_EMPTY_SUBJECT, index=False)
-    df_non_empty_subject.to_csv(paths.DATA_CLEAN_SUBJECT, index=False)
-    
     print("\nCSV files are created!")
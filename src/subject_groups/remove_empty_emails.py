@@ -2,21 +2,42 @@ import pandas as pd
 import numpy as np
 import json
 import time
-import re
+import os
+import sys
 import paths
 
-def count_words(text):
-    words = re.findall(r'\w+', text)
-    return len(words)
+# Helpers shared by the stages that stream the dataset
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'parsing_and_cleaning'))
+from chunked_csv import read_chunks, write_chunk
+
+def has_words(texts):
+    '''
+    Check which email bodies contain at least one word.
+
+    The scan stops at the first word character, so the bodies are not tokenized.
+
+    Args:
+    - texts (pandas.Series): The email bodies.
+
+    Returns:
+    - pandas.Series: Boolean mask, True for the non-empty bodies (missing bodies count as empty).
+    '''
+    return texts.str.contains(r'\w', regex=True, na=False)
 
 if __name__ == "__main__":
     
-    # Read the DataFrame from the CSV file
-    df = pd.read_csv(paths.DATA_CLEAN_SUBJECT)
-    print(f'Size with emty emails: {len(df)}')
-    df['word_count'] = df['content'].apply(count_words)
-    
-    df = df[df['word_count'] != 0]
-    df = df.drop(columns=['word_count'])
-    print(f'Size without emty emails: {len(df)}')
-    df.to_csv(paths.DATA_CLEAN_SUBJECT, index=False)
+    size_before = 0
+    size_after = 0
+    # The dataset is rewritten in place, so the chunks go to a temporary file first
+    tmp_path = paths.DATA_CLEAN_SUBJECT + '.tmp'
+
+    # Read the DataFrame from the CSV file chunk by chunk
+    for first, df in read_chunks(paths.DATA_CLEAN_SUBJECT):
+        size_before += len(df)
+        df = df[has_words(df['content'])]
+        size_after += len(df)
+        write_chunk(df, tmp_path, first)
+
+    print(f'Size with emty emails: {size_before}')
+    print(f'Size without emty emails: {size_after}')
+    os.replace(tmp_path, paths.DATA_CLEAN_SUBJECT)